@@ -16,20 +16,41 @@ function showAlert(message, type) {
     }, 5000);
 }
 
+// Card change events pushed by /api/events
+const CARD_EVENTS = ['card-created', 'card-updated', 'card-printed', 'card-deleted'];
+let cardEvents = null;
+
+// One shared EventSource per page (null if the browser lacks SSE)
+function getCardEvents() {
+    if (!window.EventSource) return null;
+    if (!cardEvents) cardEvents = new EventSource('/api/events');
+    return cardEvents;
+}
+
 // Update pending count badge
+let pendingEtag = null;
+
+function setPendingBadge(count) {
+    const badge = document.getElementById('pendingBadge');
+    if (badge) {
+        if (count > 0) {
+            badge.textContent = count;
+            badge.style.display = 'inline-block';
+        } else {
+            badge.style.display = 'none';
+        }
+    }
+}
+
 async function updatePendingCount() {
     try {
-        const response = await fetch('/api/pending-count');
+        const headers = pendingEtag ? { 'If-None-Match': pendingEtag } : {};
+        const response = await fetch('/api/pending-count', { headers });
+        if (response.status === 304) return;
+        
+        pendingEtag = response.headers.get('ETag');
         const data = await response.json();
-        const badge = document.getElementById('pendingBadge');
-        if (badge) {
-            if (data.count > 0) {
-                badge.textContent = data.count;
-                badge.style.display = 'inline-block';
-            } else {
-                badge.style.display = 'none';
-            }
-        }
+        setPendingBadge(data.count);
     } catch (error) {
         console.error('Failed to update pending count');
     }
@@ -72,6 +93,14 @@ document.addEventListener('DOMContentLoaded', () => {
     // Update pending count on all pages
     if (document.getElementById('pendingBadge')) {
         updatePendingCount();
-        setInterval(updatePendingCount, 10000);
+        const events = getCardEvents();
+        if (events) {
+            CARD_EVENTS.forEach(type => events.addEventListener(type, e => {
+                setPendingBadge(JSON.parse(e.data).stats.pending);
+            }));
+            events.addEventListener('resync', updatePendingCount);
+        } else {
+            setInterval(updatePendingCount, 10000);
+        }
     }
 });
\ No newline at end of file
@@ -0,0 +1,35 @@
+import shutil
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT / 'tools'))
+
+
+def _no_reader(path):
+    raise IOError(f"no NFC reader at {path}")
+
+
+# web_app imports the NFC writer, and nfcpy is only installed on the kiosk
+if 'nfc' not in sys.modules:
+    try:
+        import nfc  # noqa: F401
+    except ImportError:
+        nfc = types.ModuleType('nfc')
+        nfc.ContactlessFrontend = _no_reader
+        sys.modules['nfc'] = nfc
+
+
+@pytest.fixture
+def generator(tmp_path):
+    """CardGenerator on an empty repo in tmp_path, with the real templates and no git pushes"""
+    from create_card import CardGenerator
+
+    shutil.copytree(ROOT / 'templates', tmp_path / 'templates')
+    generator = CardGenerator(str(tmp_path))
+    generator.git_push_background = lambda message, usernames=None: None
+    return generator
@@ -0,0 +1,68 @@
+"""
+SQLite card store: HTTP validators and staleness with writes from elsewhere
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from card_store import CardStore
+
+TOOLS = Path(__file__).resolve().parent.parent / 'tools'
+
+
+def write_card(clients, username, **data):
+    (clients / username).mkdir(parents=True, exist_ok=True)
+    with open(clients / username / 'data.json', 'w', encoding='utf-8') as f:
+        json.dump({'NAME': username.title(), 'status': 'pending', **data}, f)
+
+
+@pytest.fixture
+def clients(tmp_path):
+    clients = tmp_path / 'clients'
+    write_card(clients, 'sara')
+    return clients
+
+
+@pytest.fixture
+def store(tmp_path, clients):
+    store = CardStore(tmp_path / 'cards.db', clients)
+    store.import_tree()
+    return store
+
+
+def test_version_moves_on_writes_from_another_process(tmp_path, clients, store):
+    before = store.version()
+    write_card(clients, 'omar')
+    script = (
+        f"import sys; sys.path.insert(0, {str(TOOLS)!r})\n"
+        f"from card_store import CardStore\n"
+        f"CardStore({str(tmp_path / 'cards.db')!r}, {str(clients)!r}).refresh('omar')\n"
+    )
+    subprocess.run([sys.executable, '-c', script], check=True)
+
+    assert store.version() != before
+    assert store.stats()['total'] == 2
+
+
+def test_outside_edits_are_swept_in(clients, store):
+    store.check_interval = 0
+    write_card(clients, 'sara', status='printed')
+    write_card(clients, 'omar')
+
+    stats = store.stats()
+    assert stats['printed'] == 1
+    assert stats['total'] == 2
+
+    (clients / 'omar' / 'data.json').unlink()
+    assert [card['username'] for card in store.cards()] == ['sara']
+
+
+def test_migrate_without_clients_dir(tmp_path):
+    store = CardStore(tmp_path / 'cards.db', tmp_path / 'clients')
+    assert store.import_tree() == 0
+    assert store.check() == {'missing_in_db': [], 'missing_on_disk': [], 'mismatched': []}
+    assert store.stats()['total'] == 0
@@ -0,0 +1,40 @@
+"""
+Event replay and resync across reconnects and restarts
+"""
+
+from event_bus import EventBus
+
+
+def drain(subscriber):
+    items = []
+    while not subscriber.empty():
+        items.append(subscriber.get_nowait())
+    return items
+
+
+def test_replays_missed_events_of_the_same_run():
+    bus = EventBus(run_id='a1')
+    for n in range(3):
+        bus.publish('card-updated', {'n': n})
+
+    missed = drain(bus.subscribe(bus.event_id(1)))
+    assert [data['n'] for _, _, data in missed] == [1, 2]
+
+
+def test_id_from_previous_run_gets_resync():
+    before = EventBus(run_id='a1')
+    for n in range(5):
+        before.publish('card-updated', {'n': n})
+
+    # Restarted process: same numbers, different run
+    after = EventBus(run_id='b2')
+    for n in range(10):
+        after.publish('card-updated', {'n': n})
+
+    assert [event for _, event, _ in drain(after.subscribe(before.event_id(5)))] == ['resync']
+
+
+def test_malformed_id_gets_resync():
+    bus = EventBus()
+    bus.publish('card-updated', {})
+    assert [event for _, event, _ in drain(bus.subscribe('7'))] == ['resync']
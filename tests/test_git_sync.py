@@ -0,0 +1,37 @@
+"""
+Git sync worker scheduling
+"""
+
+import time
+
+from git_sync import GitSyncWorker
+
+
+class DueMaintenance:
+    def due(self):
+        return True
+
+
+def test_maintenance_waits_for_idle_period_after_startup(tmp_path):
+    worker = GitSyncWorker(tmp_path, tmp_path / 'git_push.log', maintenance=DueMaintenance(),
+                           maintenance_idle=300.0)
+    now = time.monotonic()
+    assert not worker._maintenance_due(now)
+    assert worker._maintenance_due(now + 301.0)
+
+
+def test_sync_waits_for_git_lock_held_elsewhere(tmp_path):
+    lock_file = tmp_path / '.git_sync.lock'
+    worker = GitSyncWorker(tmp_path, tmp_path / 'git_push.log', debounce=0.0, lock_file=lock_file)
+    synced = []
+    worker.sync = lambda message, paths=None: (synced.append(paths), (True, 'ok'))[1]
+
+    # e.g. bulk_import committing in another process
+    other = GitSyncWorker(tmp_path, tmp_path / 'git_push.log', lock_file=lock_file)
+    with other.git_lock():
+        worker.enqueue('Add card', ['sara'])
+        time.sleep(0.3)
+        assert synced == []
+
+    assert worker.wait_idle(timeout=10)
+    assert len(synced) == 1
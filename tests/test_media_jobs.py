@@ -0,0 +1,204 @@
+"""
+Edits saved while a card's media job is running must survive it
+"""
+
+import base64
+import json
+import subprocess
+import sys
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from job_queue import JobQueue
+
+TOOLS = Path(__file__).resolve().parent.parent / 'tools'
+
+
+def photo_data_url(color):
+    from PIL import Image
+
+    output = BytesIO()
+    Image.new('RGB', (400, 400), color).save(output, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(output.getvalue()).decode('ascii')
+
+
+def wait_for_jobs(generator, timeout=30):
+    deadline = time.monotonic() + timeout
+    while generator.media_jobs.pending():
+        assert time.monotonic() < deadline, "media jobs did not finish"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def generator(generator):
+    generator.media_jobs = JobQueue(workers=2)
+    return generator
+
+
+@pytest.fixture
+def slow_variants(generator):
+    """Hold media jobs inside the photo work until released"""
+    started = threading.Event()
+    release = threading.Event()
+    build_photo_variants = generator.build_photo_variants
+
+    def slowed(client_dir, data):
+        started.set()
+        assert release.wait(30)
+        build_photo_variants(client_dir, data)
+
+    generator.build_photo_variants = slowed
+    yield started, release
+    release.set()
+
+
+def test_edit_during_media_job_is_kept(generator, slow_variants):
+    started, release = slow_variants
+    card = generator.create_card('Sara Ali', phone='0500000000', email='sara@example.com',
+                                 photo=photo_data_url('red'))
+    username = card['username']
+    assert started.wait(30)
+
+    generator.update_card(username, job_title='Engineer', company='Maroof')
+    release.set()
+    wait_for_jobs(generator)
+
+    data = generator.get_card_data(username)
+    assert data['JOB_TITLE'] == 'Engineer'
+    assert data['COMPANY'] == 'Maroof'
+    assert data['PHOTO'] == './photo.jpg'
+    assert 'assets' not in data
+    html = (generator.clients_path / username / 'index.html').read_text(encoding='utf-8')
+    assert 'Engineer' in html
+
+
+def test_processing_flag_kept_until_last_job(generator, slow_variants):
+    started, release = slow_variants
+    username = generator.create_card('Omar Saleh', phone='0500000001',
+                                     photo=photo_data_url('blue'))['username']
+    assert started.wait(30)
+
+    generator.update_card(username, bio='Hello')
+    assert generator.get_card_data(username)['assets'] == 'processing'
+    release.set()
+    wait_for_jobs(generator)
+
+    data = generator.get_card_data(username)
+    assert data['BIO'] == 'Hello'
+    assert 'assets' not in data
+    assert generator.list_cards()[0]['processing'] is False
+
+
+def test_job_result_survives_later_edit(generator):
+    username = generator.create_card('Lina Fahad', phone='0500000002',
+                                     photo=photo_data_url('green'))['username']
+    wait_for_jobs(generator)
+
+    generator.update_card(username, company='Acme')
+    wait_for_jobs(generator)
+
+    data = generator.get_card_data(username)
+    assert data['COMPANY'] == 'Acme'
+    assert data['PHOTO'] == './photo.jpg'
+    assert data.get('PHOTO_SRCSET')
+
+
+def test_media_tmp_files_stay_out_of_clients_repo(generator, monkeypatch):
+    """A scoped `git add` in the clients repo must never see a half-written file"""
+    import os
+
+    replaced = []
+    replace = os.replace
+
+    def recording_replace(src, dst):
+        replaced.append(Path(src))
+        replace(src, dst)
+
+    monkeypatch.setattr(os, 'replace', recording_replace)
+    generator.create_card('Huda Nasser', phone='0500000003', photo=photo_data_url('blue'))
+    wait_for_jobs(generator)
+
+    written = [src for src in replaced if src.suffix == '.tmp']
+    assert len(written) >= 3  # e.g. cached photo, card photo, srcset manifest, .pkpass
+    clients = generator.clients_path.resolve()
+    assert not [src for src in written if clients in src.resolve().parents]
+
+
+def photo_color(generator, username):
+    from PIL import Image
+
+    with Image.open(generator.clients_path / username / 'photo.jpg') as img:
+        return img.convert('RGB').getpixel((img.width // 2, img.height // 2))
+
+
+@pytest.fixture
+def slow_photo(generator):
+    """Hold media jobs after they have read the upload, before they clean it up"""
+    started = threading.Event()
+    release = threading.Event()
+    save_photo = generator.save_photo
+
+    def slowed(client_dir, photo):
+        result = save_photo(client_dir, photo)
+        started.set()
+        assert release.wait(30)
+        return result
+
+    generator.save_photo = slowed
+    yield started, release
+    release.set()
+
+
+def test_photo_replaced_during_media_job(generator, slow_photo):
+    started, release = slow_photo
+    username = generator.create_card('Huda Nasser', phone='0500000003',
+                                     photo=photo_data_url('red'))['username']
+    assert started.wait(30)
+
+    generator.update_card(username, photo=photo_data_url('blue'))
+    release.set()
+    wait_for_jobs(generator)
+
+    red, green, blue = photo_color(generator, username)
+    assert blue > 200 and red < 50
+    assert not list(generator.uploads_path.iterdir())
+    assert 'assets' not in generator.get_card_data(username)
+
+
+def test_claimed_upload_resumed_after_restart(generator):
+    media_jobs, generator.media_jobs = generator.media_jobs, None
+    username = generator.create_card('Reem Adel', phone='0500000004')['username']
+
+    # A job had taken the upload when the process stopped
+    generator.stash_photo(username, photo_data_url('blue'))
+    assert generator._claim_photo(username).exists()
+    data = generator.get_card_data(username)
+    data['assets'] = 'processing'
+    (generator.clients_path / username / 'data.json').write_text(json.dumps(data), encoding='utf-8')
+    generator.card_index.refresh(username)
+
+    generator.media_jobs = media_jobs
+    assert generator.resume_media_jobs() == 1
+    wait_for_jobs(generator)
+    assert photo_color(generator, username)[2] > 200
+    assert 'assets' not in generator.get_card_data(username)
+
+
+def test_card_lock_excludes_rerender_workers(generator):
+    generator.media_jobs = None
+    username = generator.create_card('Nora Said', phone='0500000005')['username']
+    script = (
+        f"import sys; sys.path.insert(0, {str(TOOLS)!r})\n"
+        f"from create_card import CardRenderer\n"
+        f"sys.exit(0 if CardRenderer({str(generator.repo_path)!r}).rerender_card({username!r}) else 1)\n"
+    )
+
+    with generator.card_lock(username):
+        worker = subprocess.Popen([sys.executable, '-c', script])
+        time.sleep(0.5)
+        assert worker.poll() is None
+    assert worker.wait(30) == 0
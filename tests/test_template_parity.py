@@ -0,0 +1,180 @@
+"""
+Parity of the compiled template engine with the regex renderer it replaced
+
+The old renderer paired every {{#if}} with the *next* {{/if}}, so a block
+nested inside another one with content around it rendered as unbalanced HTML
+(a stray or missing </div>) unless both fields were set. The engine nests
+them properly. Those blocks are listed in NESTED_BLOCKS; everywhere else the
+output must be byte-identical, and the nested templates must match what the
+old renderer produced once each nested block is spelled as a flat chain.
+"""
+
+import random
+import re
+from pathlib import Path
+
+import pytest
+
+from template_engine import compile_template
+
+CARDS_DIR = Path(__file__).resolve().parent.parent / 'templates' / 'cards'
+TEMPLATES = sorted(p.name for p in CARDS_DIR.glob('*.html'))
+
+FIELDS = [
+    'NAME', 'JOB_TITLE', 'COMPANY', 'PHONE', 'PHONE2', 'EMAIL', 'INSTAGRAM', 'LINKEDIN',
+    'TWITTER', 'YOUTUBE', 'TIKTOK', 'SNAPCHAT', 'GITHUB', 'WEBSITE', 'CUSTOM_LINK', 'BIO',
+    'PHOTO', 'CV'
+]
+
+# (template, outer field, inner field) whose output differs from the old renderer
+NESTED_BLOCKS = {
+    ('classic.html', 'JOB_TITLE', 'COMPANY'),
+    ('classic.html', 'PHONE', 'EMAIL'),
+    ('friendly.html', 'JOB_TITLE', 'COMPANY'),
+    ('friendly.html', 'PHONE', 'EMAIL'),
+    ('modern.html', 'JOB_TITLE', 'COMPANY'),
+    ('professional.html', 'JOB_TITLE', 'COMPANY'),
+}
+
+BLOCK_TAG = re.compile(r'\{\{(#if !?\w+|/if)\}\}')
+
+
+def old_render(html, data):
+    """create_card.replace_variables before the compiled engine"""
+    for key, value in data.items():
+        if value:
+            html = html.replace(f'{{{{{key}}}}}', str(value))
+    for key, value in data.items():
+        if value:
+            html = re.sub(f'{{{{#if {key}}}}}(.*?){{{{/if}}}}', r'\1', html, flags=re.DOTALL)
+        else:
+            html = re.sub(f'{{{{#if {key}}}}}.*?{{{{/if}}}}', '', html, flags=re.DOTALL)
+    for key, value in data.items():
+        if not value:
+            html = re.sub(f'{{{{#if !{key}}}}}(.*?){{{{/if}}}}', r'\1', html, flags=re.DOTALL)
+        else:
+            html = re.sub(f'{{{{#if !{key}}}}}.*?{{{{/if}}}}', '', html, flags=re.DOTALL)
+    return re.sub(r'\{\{[^}]+\}\}', '', html)
+
+
+def nested_blocks(name, html):
+    """(outer, inner) blocks where the outer one has content of its own around the inner"""
+    found = set()
+    stack = []  # [field, has own content, inner fields]
+    pos = 0
+    for match in BLOCK_TAG.finditer(html):
+        if stack and html[pos:match.start()]:
+            stack[-1][1] = True
+        pos = match.end()
+        if match.group(1) == '/if':
+            field, own_content, inner = stack.pop()
+            if own_content:
+                found.update((name, field, i) for i in inner)
+        else:
+            if stack:
+                stack[-1][2].append(match.group(1)[4:].lstrip('!'))
+            stack.append([match.group(1)[4:].lstrip('!'), False, []])
+    assert not stack, f"{name}: unclosed {{{{#if}}}}"
+    return found
+
+
+def flatten(html):
+    """Spell nested blocks as chains the old renderer handles:
+    {{#if A}}x{{#if B}}y{{/if}}z{{/if}} -> {{#if A}}x{{/if}}{{#if A}}{{#if B}}y{{/if}}{{/if}}{{#if A}}z{{/if}}
+    """
+    out = []
+    stack = []
+    pos = 0
+
+    def emit(text):
+        if text:
+            out.append(''.join(stack) + text + '{{/if}}' * len(stack))
+
+    for match in BLOCK_TAG.finditer(html):
+        emit(html[pos:match.start()])
+        pos = match.end()
+        if match.group(1) == '/if':
+            stack.pop()
+        else:
+            stack.append(match.group(0))
+    emit(html[pos:])
+    return ''.join(out)
+
+
+def card_data(on, order):
+    """Card data as create_card/replace_variables build it"""
+    data = {field: f'v-{field.lower()}' if field in on else '' for field in FIELDS}
+    data['PHOTO'] = './photo.jpg' if 'PHOTO' in on else ''
+    data.update(template='x', created_at='2026-01-01T00:00:00', source='admin',
+                status='pending', print_count=0, print_history=[])
+    if data['PHONE']:
+        data['PHONE_INTL'] = '966' + data['PHONE']
+    if data['PHONE2']:
+        data['PHONE2_INTL'] = '966' + data['PHONE2']
+    if data['NAME']:
+        data['NAME_INITIAL'] = 'V'
+    keys = list(data)
+    order.shuffle(keys)
+    return {key: data[key] for key in keys}
+
+
+def field_combinations():
+    rnd = random.Random(7)
+    combos = [set(), set(FIELDS)]
+    combos += [{f} for f in FIELDS] + [set(FIELDS) - {f} for f in FIELDS]
+    # Every state of the nested pairs, with the other fields all on and all off
+    pairs = {(outer, inner) for _, outer, inner in NESTED_BLOCKS}
+    for outer, inner in pairs:
+        for base in (set(), set(FIELDS) - {outer, inner}):
+            for extra in ((), (outer,), (inner,), (outer, inner)):
+                combos.append(base | set(extra))
+    combos += [{f for f in FIELDS if rnd.random() < 0.5} for _ in range(100)]
+    return combos
+
+
+COMBINATIONS = field_combinations()
+
+
+@pytest.fixture(scope='module', params=TEMPLATES)
+def template(request):
+    html = (CARDS_DIR / request.param).read_text(encoding='utf-8')
+    return request.param, html, compile_template(html)
+
+
+def test_nested_blocks_are_the_documented_ones():
+    found = set()
+    for name in TEMPLATES:
+        found |= nested_blocks(name, (CARDS_DIR / name).read_text(encoding='utf-8'))
+    assert found == NESTED_BLOCKS
+
+
+def test_matches_old_renderer(template):
+    name, html, compiled = template
+    if any(n == name for n, _, _ in NESTED_BLOCKS):
+        pytest.skip("nested blocks: covered by test_matches_old_renderer_flattened")
+    order = random.Random(name)
+    for on in COMBINATIONS:
+        data = card_data(on, order)
+        assert compiled.render(dict(data)) == old_render(html, dict(data)), sorted(on)
+
+
+def test_matches_old_renderer_flattened(template):
+    name, html, compiled = template
+    flat = flatten(html)
+    order = random.Random(name)
+    for on in COMBINATIONS:
+        data = card_data(on, order)
+        assert compiled.render(dict(data)) == old_render(flat, dict(data)), sorted(on)
+    # Flattening changes nothing for the engine itself
+    assert compile_template(flat).render(card_data(set(FIELDS), order)) == \
+        compiled.render(card_data(set(FIELDS), order))
+
+
+def test_nested_blocks_render_balanced():
+    """Where the old renderer left a stray </div>, the engine keeps the markup balanced"""
+    for name in sorted({n for n, _, _ in NESTED_BLOCKS}):
+        html = (CARDS_DIR / name).read_text(encoding='utf-8')
+        compiled = compile_template(html)
+        for on in COMBINATIONS:
+            rendered = compiled.render(card_data(on, random.Random(0)))
+            assert rendered.count('<div') == rendered.count('</div>'), (name, sorted(on))
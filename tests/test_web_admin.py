@@ -0,0 +1,59 @@
+"""
+Admin re-render route
+"""
+
+import threading
+import time
+
+import web_app
+
+
+def test_rerender_pushes_only_rerendered_cards(generator, monkeypatch):
+    pushes = []
+    generator.git_push_background = lambda message, usernames=None: pushes.append(usernames)
+    generator.create_card('Sara Ali', template='modern')
+    generator.create_card('Omar Saleh', template='classic')
+    monkeypatch.setattr(web_app, 'generator', generator)
+    client = web_app.app.test_client()
+
+    assert client.post('/api/admin/rerender', json={'template': 'modern'}).status_code == 202
+    deadline = time.monotonic() + 60
+    while client.get('/api/admin/rerender').get_json()['running']:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+    state = client.get('/api/admin/rerender').get_json()
+    assert state['result']['rendered'] == 1
+    assert pushes == [['sara-ali']]
+
+
+def test_concurrent_rerender_requests_start_one_run(generator, monkeypatch):
+    monkeypatch.setattr(web_app, 'generator', generator)
+    release = threading.Event()
+    runs = []
+
+    def slow_rerender(*args, **kwargs):
+        runs.append(1)
+        release.wait(30)
+        return {'total': 0, 'rendered': 0, 'rendered_usernames': [], 'skipped': 0, 'failed': []}
+
+    monkeypatch.setattr(web_app, 'rerender_cards', slow_rerender)
+    barrier = threading.Barrier(8)
+    codes = []
+
+    def post():
+        barrier.wait()
+        codes.append(web_app.app.test_client().post('/api/admin/rerender', json={}).status_code)
+
+    threads = [threading.Thread(target=post) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    release.set()
+
+    assert sorted(codes) == [202] + [409] * 7
+    client = web_app.app.test_client()
+    while client.get('/api/admin/rerender').get_json()['running']:
+        time.sleep(0.01)
+    assert len(runs) == 1
@@ -0,0 +1,47 @@
+"""
+Upload type checks on the card API (multipart and JSON bodies)
+"""
+
+import base64
+import io
+
+import pytest
+
+import web_app
+
+
+@pytest.fixture
+def client(generator, monkeypatch):
+    monkeypatch.setattr(web_app, 'generator', generator)
+    return web_app.app.test_client()
+
+
+@pytest.mark.parametrize('field, filename, mimetype, error', [
+    ('photo', 'photo.pdf', 'application/pdf', 'Photo must be an image'),
+    ('cv', 'cv.png', 'image/png', 'CV must be a PDF file'),
+])
+def test_multipart_wrong_type_rejected(client, field, filename, mimetype, error):
+    response = client.post('/api/create', content_type='multipart/form-data', data={
+        'name': 'Sara Ali',
+        field: (io.BytesIO(b'not what it claims'), filename, mimetype)
+    })
+    assert response.status_code == 400
+    assert response.get_json()['error'] == error
+
+
+@pytest.mark.parametrize('field, value, error', [
+    ('photo', 'data:application/pdf;base64,' + base64.b64encode(b'%PDF').decode(), 'Photo must be an image'),
+    ('cv', 'data:image/png;base64,' + base64.b64encode(b'png').decode(), 'CV must be a PDF file'),
+])
+def test_json_wrong_type_rejected(client, field, value, error):
+    response = client.post('/api/create', json={'name': 'Sara Ali', field: value})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == error
+
+
+def test_multipart_pdf_cv_accepted(client):
+    response = client.post('/api/create', content_type='multipart/form-data', data={
+        'name': 'Sara Ali',
+        'cv': (io.BytesIO(b'%PDF-1.4 test'), 'cv.pdf', 'application/pdf')
+    })
+    assert response.status_code == 201
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Maroof - Git Sync Benchmark
+Drives concurrent card changes through the sync worker against a local bare remote
+"""
+
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from create_card import CardGenerator
+from git_sync import fast_import_commit
+
+
+def _git(cwd: Path, *args) -> str:
+    result = subprocess.run(['git', *args], cwd=str(cwd), capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+def make_sandbox(root: Path, templates_src: Path) -> Path:
+    """Repo layout with clients/ cloned from a fresh bare remote; returns the repo path"""
+    remote = root / 'remote.git'
+    repo = root / 'repo'
+    _git(root, 'init', '-q', '--bare', '-b', 'main', str(remote))
+    shutil.copytree(templates_src, repo / 'templates')
+
+    clients = repo / 'clients'
+    _git(root, 'clone', '-q', str(remote), str(clients))
+    _git(clients, 'config', 'user.name', 'Maroof Bench')
+    _git(clients, 'config', 'user.email', 'bench@maroof.local')
+    _git(clients, 'checkout', '-q', '-B', 'main')
+    _git(clients, 'commit', '-q', '--allow-empty', '-m', 'Initial commit')
+    _git(clients, 'push', '-q', 'origin', 'main')
+    return repo
+
+
+def seed_cards(generator: CardGenerator, count: int):
+    """Pre-populate the remote so staging cost can be compared at repo size"""
+    usernames = [generator.create_card(name=f'Seed {i}', phone='0500000000')['username'] for i in range(count)]
+    fast_import_commit(generator.clients_path, usernames, f'Seed {count} cards')
+    _git(generator.clients_path, 'push', '-q', 'origin', 'main')
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_benchmark(
+    changes: int = 50,
+    concurrency: int = 8,
+    seed: int = 0,
+    debounce: float = 0.5,
+    max_delay: float = 5.0,
+    full_tree: bool = False,
+    templates_src: Path = None,
+    timeout: float = 300.0
+) -> Dict:
+    """Create `changes` cards from `concurrency` threads and wait until all are on the remote"""
+    templates_src = templates_src or Path(__file__).resolve().parent.parent / 'templates'
+
+    with tempfile.TemporaryDirectory(prefix='maroof-sync-bench-') as tmp:
+        repo = make_sandbox(Path(tmp), templates_src)
+        generator = CardGenerator(repo)
+        # .pkpass signing is not part of the sync path
+        generator.build_pkpass = lambda username, data=None: False
+
+        worker = generator.git_sync
+        worker.debounce = debounce
+        worker.max_delay = max_delay
+
+        quiet = io.StringIO()
+        with contextlib.redirect_stdout(quiet):
+            if seed:
+                seed_cards(generator, seed)
+            # The first sync after startup always reconciles the whole tree; keep it out of the numbers
+            worker.enqueue('Warm up')
+            worker.wait_idle(timeout)
+        remote = Path(tmp) / 'remote.git'
+        commits_before = int(_git(remote, 'rev-list', '--count', 'main'))
+
+        # Publish latency: enqueue -> end of the first successful sync taken after it
+        lock = threading.Lock()
+        queued: Dict[str, float] = {}
+        latencies: List[float] = []
+        results: List[Dict] = []
+        all_published = threading.Event()
+
+        def on_result(result: Dict):
+            finished = time.monotonic()
+            taken_at = finished - result['duration']
+            with lock:
+                results.append(result)
+                if result['success']:
+                    for key, at in list(queued.items()):
+                        if at <= taken_at:
+                            latencies.append(finished - at)
+                            del queued[key]
+                if len(latencies) == changes:
+                    all_published.set()
+
+        worker.on_result = on_result
+
+        def change(i: int) -> float:
+            started = time.monotonic()
+            card = generator.create_card(name=f'Bench {i}', phone='0500000000')
+            with lock:
+                queued[card['username']] = time.monotonic()
+            generator.git_push_background(f"Add card: Bench {i}", None if full_tree else [card['username']])
+            return time.monotonic() - started
+
+        start = time.monotonic()
+        with contextlib.redirect_stdout(quiet):
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                request_times = list(pool.map(change, range(changes)))
+            published = all_published.wait(timeout)
+            worker.wait_idle(timeout)
+        elapsed = time.monotonic() - start
+
+        log_file = repo / 'git_push.log'
+        log_text = log_file.read_text(encoding='utf-8') if log_file.exists() else ''
+        commits_after = int(_git(remote, 'rev-list', '--count', 'main'))
+
+        return {
+            'changes': changes,
+            'concurrency': concurrency,
+            'seed_cards': seed,
+            'scope': 'full' if full_tree else 'paths',
+            'published': published,
+            'elapsed': round(elapsed, 3),
+            'changes_per_second': round(changes / elapsed, 1) if elapsed > 0 else 0.0,
+            'request_ms_p50': round(percentile(request_times, 50) * 1000, 1),
+            'request_ms_p95': round(percentile(request_times, 95) * 1000, 1),
+            'publish_latency_p50': round(percentile(latencies, 50), 3),
+            'publish_latency_p95': round(percentile(latencies, 95), 3),
+            'publish_latency_max': round(max(latencies, default=0.0), 3),
+            'syncs': len(results),
+            'failed_syncs': sum(1 for r in results if not r['success']),
+            'sync_seconds': round(sum(r['duration'] for r in results), 3),
+            'commits_created': commits_after - commits_before,
+            'lock_contention': log_text.count('index.lock')
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the clients git sync path against a temporary bare remote")
+    parser.add_argument('--changes', type=int, default=50, help="Card changes to publish")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent request threads")
+    parser.add_argument('--seed', type=int, default=0, help="Cards already in the remote before the run")
+    parser.add_argument('--debounce', type=float, default=0.5, help="Sync worker debounce (seconds)")
+    parser.add_argument('--max-delay', type=float, default=5.0, help="Sync worker max batching delay (seconds)")
+    parser.add_argument('--full-tree', action='store_true', help="Queue changes without paths (whole-tree staging)")
+    parser.add_argument('--json', action='store_true', help="Print the result as JSON")
+    args = parser.parse_args()
+
+    result = run_benchmark(
+        changes=args.changes,
+        concurrency=args.concurrency,
+        seed=args.seed,
+        debounce=args.debounce,
+        max_delay=args.max_delay,
+        full_tree=args.full_tree
+    )
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{'✅' if result['published'] else '❌'} {result['changes']} changes from "
+              f"{result['concurrency']} threads in {result['elapsed']:.2f}s ({result['changes_per_second']}/s)")
+        print(f"   request:  p50 {result['request_ms_p50']}ms  p95 {result['request_ms_p95']}ms")
+        print(f"   publish:  p50 {result['publish_latency_p50']}s  p95 {result['publish_latency_p95']}s  "
+              f"max {result['publish_latency_max']}s")
+        print(f"   git:      {result['syncs']} syncs ({result['failed_syncs']} failed), "
+              f"{result['commits_created']} commits, {result['sync_seconds']}s in git, "
+              f"{result['lock_contention']} index.lock conflicts")
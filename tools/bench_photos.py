@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Maroof - Photo Benchmark
+Compares decode paths (latency, peak memory) and fixed vs size-budgeted JPEG encoding
+"""
+
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from photo_variants import (
+    PHOTO_BUDGET_BYTES, PHOTO_MAX_SIZE, PHOTO_QUALITY,
+    _load_photo, compress_photo, encode_jpeg, fit_budget
+)
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def full_decode(source: Path) -> bytes:
+    """The previous compress_image path: decode at full size, then thumbnail"""
+    from PIL import Image
+
+    img = Image.open(source)
+    if img.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+        img = background
+
+    if img.width > PHOTO_MAX_SIZE[0] or img.height > PHOTO_MAX_SIZE[1]:
+        img.thumbnail(PHOTO_MAX_SIZE, Image.Resampling.LANCZOS)
+
+    output = BytesIO()
+    img.save(output, format='JPEG', quality=PHOTO_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+PIPELINES = {
+    'full': full_decode,
+    'draft': compress_photo
+}
+
+
+def make_corpus(directory: Path, count: int, megapixels: float) -> List[Path]:
+    """Phone-sized JPEGs with enough detail to be realistic to decode"""
+    from PIL import Image
+
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    paths = []
+    for i in range(count):
+        noise = Image.effect_noise((width, height), 8 + i * 4)
+        gradient = Image.linear_gradient('L').resize((width, height))
+        img = Image.merge('RGB', (noise, gradient, gradient.rotate(90 * (i % 4))))
+        path = directory / f'sample-{i}.jpg'
+        img.save(path, format='JPEG', quality=92)
+        paths.append(path)
+    return paths
+
+
+def _peak_rss_kb() -> int:
+    """Peak resident memory of this process (ru_maxrss survives exec on Linux; VmHWM does not)"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _measure(pipeline: str, paths: List[str], rounds: int) -> Dict:
+    """Run one pipeline over the corpus in a fresh process (so peak RSS is its own)"""
+    import PIL.Image  # noqa: F401 - count the import in the baseline, not the decode
+
+    baseline_kb = _peak_rss_kb()
+    fn = PIPELINES[pipeline]
+    latencies = []
+    output_bytes = 0
+    for _ in range(rounds):
+        for path in paths:
+            started = time.perf_counter()
+            output_bytes = len(fn(Path(path)))
+            latencies.append(time.perf_counter() - started)
+
+    peak_kb = _peak_rss_kb()
+    return {
+        'latencies': latencies,
+        'baseline_mb': baseline_kb / 1024,
+        'peak_mb': peak_kb / 1024,
+        'output_kb': output_bytes / 1024
+    }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_benchmark(corpus: List[Path], rounds: int = 3) -> Dict[str, Dict]:
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for pipeline in PIPELINES:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            raw = pool.submit(_measure, pipeline, [str(p) for p in corpus], rounds).result()
+        latencies = raw['latencies']
+        results[pipeline] = {
+            'images': len(corpus),
+            'rounds': rounds,
+            'ms_p50': round(percentile(latencies, 50) * 1000, 1),
+            'ms_p95': round(percentile(latencies, 95) * 1000, 1),
+            'ms_mean': round(sum(latencies) / len(latencies) * 1000, 1),
+            'peak_rss_mb': round(raw['peak_mb'], 1),
+            'decode_rss_mb': round(raw['peak_mb'] - raw['baseline_mb'], 1),
+            'output_kb': round(raw['output_kb'], 1)
+        }
+    return results
+
+
+def run_budget_benchmark(corpus: List[Path], budget: int = PHOTO_BUDGET_BYTES) -> Dict:
+    """Bytes and encode time of the fixed-quality encoder vs the budget search"""
+    fixed_bytes, budget_bytes = [], []
+    fixed_times, budget_times = [], []
+    qualities = []
+    over_budget = 0
+
+    for path in corpus:
+        img = _load_photo(path, PHOTO_MAX_SIZE)
+
+        started = time.perf_counter()
+        fixed = encode_jpeg(img, PHOTO_QUALITY)
+        fixed_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        fitted, params = fit_budget(img, budget)
+        budget_times.append(time.perf_counter() - started)
+
+        fixed_bytes.append(len(fixed))
+        budget_bytes.append(len(fitted))
+        qualities.append(params['quality'])
+        over_budget += len(fitted) > budget
+
+    saved = sum(fixed_bytes) - sum(budget_bytes)
+    return {
+        'images': len(corpus),
+        'budget_kb': round(budget / 1024, 1),
+        'fixed_kb_mean': round(sum(fixed_bytes) / len(corpus) / 1024, 1),
+        'fixed_kb_max': round(max(fixed_bytes) / 1024, 1),
+        'budget_kb_mean': round(sum(budget_bytes) / len(corpus) / 1024, 1),
+        'budget_kb_max': round(max(budget_bytes) / 1024, 1),
+        'saved_percent': round(saved / sum(fixed_bytes) * 100, 1) if sum(fixed_bytes) else 0.0,
+        'over_budget': over_budget,
+        'quality_min': min(qualities),
+        'quality_max': max(qualities),
+        'fixed_encode_ms_p50': round(percentile(fixed_times, 50) * 1000, 1),
+        'budget_encode_ms_p50': round(percentile(budget_times, 50) * 1000, 1),
+        'budget_encode_ms_p95': round(percentile(budget_times, 95) * 1000, 1)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark photo decoding: full decode vs draft/reduce")
+    parser.add_argument('--corpus', help="Directory of sample photos (default: generate synthetic ones)")
+    parser.add_argument('--count', type=int, default=5, help="Synthetic photos to generate")
+    parser.add_argument('--megapixels', type=float, default=12.0, help="Size of synthetic photos")
+    parser.add_argument('--rounds', type=int, default=3, help="Passes over the corpus per pipeline")
+    parser.add_argument('--budget', type=float, help="Compare fixed quality vs this byte budget (KB) instead of decoding")
+    parser.add_argument('--json', action='store_true', help="Print the result as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='maroof-photo-bench-') as tmp:
+        if args.corpus:
+            corpus = sorted(p for p in Path(args.corpus).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        else:
+            print(f"🖼️ Generating {args.count} × {args.megapixels:g} MP photos...", file=sys.stderr)
+            corpus = make_corpus(Path(tmp), args.count, args.megapixels)
+        if not corpus:
+            print("❌ No photos found")
+            sys.exit(1)
+
+        if args.budget:
+            results = run_budget_benchmark(corpus, int(args.budget * 1024))
+        else:
+            results = run_benchmark(corpus, args.rounds)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    elif args.budget:
+        r = results
+        print(f"   fixed q{PHOTO_QUALITY}: mean {r['fixed_kb_mean']}KB  max {r['fixed_kb_max']}KB  "
+              f"encode p50 {r['fixed_encode_ms_p50']}ms")
+        print(f"  budget {r['budget_kb']}KB: mean {r['budget_kb_mean']}KB  max {r['budget_kb_max']}KB  "
+              f"encode p50 {r['budget_encode_ms_p50']}ms  p95 {r['budget_encode_ms_p95']}ms  "
+              f"(quality {r['quality_min']}-{r['quality_max']}, {r['over_budget']} over budget)")
+        print(f"📉 {r['saved_percent']}% fewer bytes")
+    else:
+        for pipeline, r in results.items():
+            print(f"{pipeline:>6}: p50 {r['ms_p50']}ms  p95 {r['ms_p95']}ms  "
+                  f"peak RSS {r['peak_rss_mb']}MB (+{r['decode_rss_mb']}MB decoding)  "
+                  f"output {r['output_kb']}KB")
+        full, draft = results['full'], results['draft']
+        if draft['ms_p50']:
+            print(f"⚡ draft/reduce: {full['ms_p50'] / draft['ms_p50']:.1f}× faster, "
+                  f"{full['decode_rss_mb'] - draft['decode_rss_mb']:.0f}MB less peak memory")
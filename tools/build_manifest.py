@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Maroof - Incremental Build Manifest
+Records the input hashes behind each card's outputs so unchanged cards are skipped
+"""
+
+import os
+import sys
+import json
+import hashlib
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from build_pkpass import DEFAULT_THEME, pass_assets_digest
+
+# Bump when the rendering of index.html, contact.vcf or .pkpass changes
+RENDERER_VERSION = '4'
+
+# Inputs each output depends on
+OUTPUT_DEPENDENCIES = {
+    'index.html': ('data', 'template', 'renderer'),
+    'contact.vcf': ('data', 'renderer'),
+    'pkpass': ('data', 'photo', 'pass_assets', 'renderer'),
+}
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of a file, or '' if it does not exist"""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return ''
+
+
+@lru_cache(maxsize=32)
+def text_digest(text: str) -> str:
+    """SHA-256 of template text (cached, templates are shared by many cards)"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def output_digest(inputs: Dict[str, str], output: str) -> str:
+    """Combined hash of the inputs an output depends on"""
+    key = '\n'.join(f"{name}={inputs[name]}" for name in OUTPUT_DEPENDENCIES[output])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def output_path(client_dir: Path, username: str, output: str) -> Path:
+    if output == 'pkpass':
+        return client_dir / f"{username}.pkpass"
+    return client_dir / output
+
+
+def write_if_changed(path: Path, content: str) -> bool:
+    """Write text only when it differs from what is on disk"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return True
+
+
+def build_card(generator, username: str, entry: Optional[Dict] = None, force: bool = False) -> Optional[Dict]:
+    """Rebuild only the outputs of a card whose inputs changed
+
+    Returns the new manifest entry with a 'built' list, or None if the card is gone.
+    """
+    client_dir = generator.clients_path / username
+    data_file = client_dir / 'data.json'
+
+    # Same lock as card edits, so a page rendered from old data never lands after a newer one
+    with generator.card_lock(username):
+        try:
+            with open(data_file, 'rb') as f:
+                data_bytes = f.read()
+        except FileNotFoundError:
+            return None
+
+        data = json.loads(data_bytes.decode('utf-8'))
+        template_name = data.get('template', 'professional')
+
+        inputs = {
+            'data': hashlib.sha256(data_bytes).hexdigest(),
+            'template': text_digest(generator.load_template(template_name)),
+            'photo': file_digest(client_dir / 'photo.jpg'),
+            'pass_assets': pass_assets_digest(DEFAULT_THEME),
+            'renderer': RENDERER_VERSION,
+        }
+
+        previous = (entry or {}).get('outputs', {})
+        outputs = {}
+        built = []
+
+        for output in OUTPUT_DEPENDENCIES:
+            digest = output_digest(inputs, output)
+            outputs[output] = digest
+
+            if not force and previous.get(output) == digest and output_path(client_dir, username, output).exists():
+                continue
+
+            if output == 'index.html':
+                write_if_changed(client_dir / 'index.html', generator.render_html(template_name, data))
+            elif output == 'contact.vcf':
+                generator._create_vcard(data, username, client_dir)
+            elif output == 'pkpass':
+                if not generator.build_pkpass(username):
+                    # Leave it stale so the next build retries
+                    outputs[output] = ''
+            built.append(output)
+
+        return {'inputs': inputs, 'outputs': outputs, 'built': built}
+
+
+class BuildManifest:
+    """Per-card input/output hashes, stored outside the clients repo"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            manifest = {}
+
+        # A different renderer invalidates every entry
+        if manifest.get('renderer') == RENDERER_VERSION:
+            self.entries = manifest.get('cards', {})
+        else:
+            self.entries = {}
+
+    def save(self):
+        with self._lock:
+            manifest = {'renderer': RENDERER_VERSION, 'cards': self.entries}
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def get(self, username: str) -> Optional[Dict]:
+        return self.entries.get(username)
+
+    def record(self, username: str, entry: Dict):
+        with self._lock:
+            self.entries[username] = {'inputs': entry['inputs'], 'outputs': entry['outputs']}
+
+    def forget(self, username: str):
+        with self._lock:
+            self.entries.pop(username, None)
+
+    def prune(self, usernames):
+        """Drop entries for cards that no longer exist"""
+        keep = set(usernames)
+        with self._lock:
+            for username in list(self.entries):
+                if username not in keep:
+                    del self.entries[username]
+
+
+def get_manifest(generator) -> BuildManifest:
+    return BuildManifest(generator.repo_path / '.build_manifest.json')
@@ -1,55 +1,79 @@
 #!/usr/bin/env python3
-"""Build proper .pkpass file for Apple Wallet"""
+"""Build proper .pkpass file for Apple Wallet
 
+Importable: CardGenerator calls build_pkpass() in-process with the card
+data it already has. Running this file is a thin CLI wrapper around it.
+"""
+
+import io
+import sys
 import json
 import zipfile
 import hashlib
+import threading
 from pathlib import Path
-from PIL import Image
-import qrcode
-
-def create_icon(client_dir):
-    """Create a simple icon.png if doesn't exist"""
-    icon_path = client_dir / "icon.png"
-    if not icon_path.exists():
-        # Create simple 29x29 icon (required by Apple)
-        img = Image.new('RGB', (29, 29), color='#f59e0b')
-        img.save(icon_path)
-        print(f"✅ Created icon: {icon_path}")
-    return icon_path
-
-def create_logo(client_dir):
-    """Create a simple logo.png if doesn't exist"""
-    logo_path = client_dir / "logo.png"
-    if not logo_path.exists():
-        # Create simple 160x50 logo
-        img = Image.new('RGB', (160, 50), color='#000000')
-        img.save(logo_path)
-        print(f"✅ Created logo: {logo_path}")
-    return logo_path
-
-def build_pkpass(username: str):
-    """Build a proper .pkpass file"""
-    
-    base_dir = Path(__file__).parent.parent
-    client_dir = base_dir / "clients" / username
-    data_file = client_dir / "data.json"
-    
-    if not data_file.exists():
-        print(f"❌ Card not found: {username}")
-        return False
-    
-    print(f"📦 Building .pkpass for {username}...")
-    
-    # Load data
-    with open(data_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # Card URL
-    card_url = f"https://maroof-id.github.io/maroof-cards-data/{username}/"
-    
-    # Create pass.json
-    pass_data = {
+from typing import Dict, Optional, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from media_store import tmp_path_for, write_atomic
+
+CARD_BASE_URL = 'https://maroof-id.github.io/maroof-cards-data'
+
+# Fixed member timestamp: an unchanged pass rebuilds byte-identical (no git churn)
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# Written next to the pass by earlier versions; removed on rebuild
+STALE_FILES = ('pass.json', 'manifest.json', 'signature', 'icon.png', 'logo.png')
+
+# Pass images per theme: name -> (size, color). Apple requires icon.png (29x29)
+DEFAULT_THEME = 'default'
+THEMES = {
+    DEFAULT_THEME: {
+        'icon.png': ((29, 29), '#f59e0b'),
+        'logo.png': ((160, 50), '#000000')
+    }
+}
+ASSETS_PATH = Path(__file__).resolve().parent.parent / 'templates' / 'pkpass'
+
+_assets: Dict[str, Dict[str, Tuple[bytes, str]]] = {}
+_assets_lock = threading.Lock()
+
+def pass_assets(theme: str = DEFAULT_THEME) -> Dict[str, Tuple[bytes, str]]:
+    """Shared icon.png/logo.png bytes and SHA1 for a theme, built once per process
+
+    templates/pkpass/<theme>/<name> replaces a generated image when present.
+    """
+    with _assets_lock:
+        if theme not in _assets:
+            assets = {}
+            for name, (size, color) in THEMES[theme].items():
+                custom_path = ASSETS_PATH / theme / name
+                if custom_path.exists():
+                    content = custom_path.read_bytes()
+                else:
+                    from PIL import Image
+                    buffer = io.BytesIO()
+                    Image.new('RGB', size, color=color).save(buffer, format='PNG')
+                    content = buffer.getvalue()
+                assets[name] = (content, hashlib.sha1(content).hexdigest())
+            _assets[theme] = assets
+        return _assets[theme]
+
+def pass_assets_digest(theme: str = DEFAULT_THEME) -> str:
+    """One hash over a theme's pass images, for incremental builds"""
+    key = '\n'.join(f"{name}={sha1}" for name, (_, sha1) in sorted(pass_assets(theme).items()))
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def _add_member(zipf: zipfile.ZipFile, name: str, content: bytes):
+    info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    zipf.writestr(info, content)
+
+def pass_json(username: str, data: Dict) -> Dict:
+    """pass.json contents for a card"""
+    card_url = f"{CARD_BASE_URL}/{username}/"
+    return {
         "formatVersion": 1,
         "passTypeIdentifier": "pass.com.maroof.card",
         "serialNumber": username,
@@ -110,66 +134,80 @@ def build_pkpass(username: str):
             "messageEncoding": "iso-8859-1"
         }
     }
-    
-    pass_json_path = client_dir / "pass.json"
-    with open(pass_json_path, 'w', encoding='utf-8') as f:
-        json.dump(pass_data, f, indent=2, ensure_ascii=False)
-    print(f"✅ Created pass.json")
-    
-    # Create icon and logo
-    create_icon(client_dir)
-    create_logo(client_dir)
-    
-    # Create manifest.json
-    manifest = {}
-    files_to_include = ['pass.json', 'icon.png', 'logo.png']
-    
+
+def build_pkpass(username: str, data: Optional[Dict] = None, clients_path: Optional[Path] = None,
+                 theme: str = DEFAULT_THEME) -> Optional[Path]:
+    """Build a proper .pkpass file; returns its path, or None if the card does not exist
+
+    `data` is the card's data.json contents (read from disk when omitted).
+    """
+    clients_path = Path(clients_path) if clients_path else Path(__file__).resolve().parent.parent / "clients"
+    client_dir = clients_path / username
+
+    if data is None:
+        data_file = client_dir / "data.json"
+        if not data_file.exists():
+            print(f"❌ Card not found: {username}")
+            return None
+        with open(data_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    elif not client_dir.is_dir():
+        print(f"❌ Card not found: {username}")
+        return None
+
+    pass_data = pass_json(username, data)
+
+    # Serialize every member once and hash it as it goes into the manifest;
+    # icon and logo come from the shared assets with their SHA1 precomputed
+    pass_bytes = json.dumps(pass_data, indent=2, ensure_ascii=False).encode('utf-8')
+    members = {'pass.json': (pass_bytes, hashlib.sha1(pass_bytes).hexdigest())}
+    members.update(pass_assets(theme))
+
     # Add photo if exists
     photo_path = client_dir / "photo.jpg"
     if photo_path.exists():
-        files_to_include.append('photo.jpg')
-    
-    for filename in files_to_include:
-        file_path = client_dir / filename
-        if file_path.exists():
-            with open(file_path, 'rb') as f:
-                file_hash = hashlib.sha1(f.read()).hexdigest()
-                manifest[filename] = file_hash
-    
-    manifest_path = client_dir / "manifest.json"
-    with open(manifest_path, 'w') as f:
-        json.dump(manifest, f, indent=2)
-    print(f"✅ Created manifest.json with {len(manifest)} files")
-    
-    # Create signature (dummy - will show warning on iOS)
-    signature_path = client_dir / "signature"
-    # Use manifest hash as signature placeholder
+        photo_bytes = photo_path.read_bytes()
+        members['photo.jpg'] = (photo_bytes, hashlib.sha1(photo_bytes).hexdigest())
+
+    manifest = {name: sha1 for name, (_, sha1) in members.items()}
+
+    # Signature (dummy - will show warning on iOS): manifest hash as placeholder
     manifest_str = json.dumps(manifest, sort_keys=True)
     signature_hash = hashlib.sha256(manifest_str.encode()).digest()
-    with open(signature_path, 'wb') as f:
-        f.write(signature_hash)
-    print(f"✅ Created signature (self-signed)")
-    
-    # Build .pkpass ZIP file
+
+    # Build .pkpass ZIP in memory
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        _add_member(zipf, 'pass.json', members.pop('pass.json')[0])
+        _add_member(zipf, 'manifest.json', json.dumps(manifest, indent=2).encode('utf-8'))
+        _add_member(zipf, 'signature', signature_hash)
+        for name, (content, _) in members.items():
+            _add_member(zipf, name, content)
+    pkpass_bytes = buffer.getvalue()
+
+    # Only the .pkpass itself is written, atomically, and only when it changed
     pkpass_path = client_dir / f"{username}.pkpass"
-    with zipfile.ZipFile(pkpass_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        # Add pass.json
-        zipf.write(pass_json_path, 'pass.json')
-        
-        # Add manifest.json
-        zipf.write(manifest_path, 'manifest.json')
-        
-        # Add signature
-        zipf.write(signature_path, 'signature')
-        
-        # Add icon and logo
-        zipf.write(client_dir / 'icon.png', 'icon.png')
-        zipf.write(client_dir / 'logo.png', 'logo.png')
-        
-        # Add photo if exists
-        if photo_path.exists():
-            zipf.write(photo_path, 'photo.jpg')
-    
+    if not pkpass_path.exists() or pkpass_path.read_bytes() != pkpass_bytes:
+        write_atomic(pkpass_path, pkpass_bytes, tmp_path_for(clients_path))
+
+    # Intermediate files older versions left in the card directory
+    for name in STALE_FILES:
+        (client_dir / name).unlink(missing_ok=True)
+
+    return pkpass_path
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 build_pkpass.py <username>")
+        print("Example: python3 build_pkpass.py mhmd-kaml")
+        sys.exit(1)
+
+    username = sys.argv[1]
+    print(f"📦 Building .pkpass for {username}...")
+    pkpass_path = build_pkpass(username)
+    if pkpass_path is None:
+        sys.exit(1)
+
     print(f"\n🎉 SUCCESS! Created: {pkpass_path}")
     print(f"📦 File size: {pkpass_path.stat().st_size / 1024:.1f} KB")
     print(f"\n⚠️  IMPORTANT:")
@@ -177,20 +215,9 @@ def build_pkpass(username: str):
     print(f"   - iOS will show: 'This pass is not from a trusted source'")
     print(f"   - User must tap 'Add' to accept")
     print(f"\n📱 Download URL:")
-    print(f"   https://maroof-id.github.io/maroof-cards-data/{username}/{username}.pkpass")
+    print(f"   {CARD_BASE_URL}/{username}/{username}.pkpass")
     print(f"\n🔄 Next steps:")
     print(f"   cd ~/maroof/maroof-cards/clients")
-    print(f"   git add {username}/{username}.pkpass {username}/icon.png {username}/logo.png")
+    print(f"   git add {username}/{username}.pkpass")
     print(f"   git commit -m 'Add pkpass for {username}'")
     print(f"   git push origin main")
-    
-    return True
-
-if __name__ == "__main__":
-    import sys
-    if len(sys.argv) > 1:
-        username = sys.argv[1]
-        build_pkpass(username)
-    else:
-        print("Usage: python3 build_pkpass.py <username>")
-        print("Example: python3 build_pkpass.py mhmd-kaml")
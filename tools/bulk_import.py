@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Maroof - Bulk Card Import
+Creates many cards from a CSV or NDJSON file and commits them in one go
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from create_card import CardGenerator
+from git_sync import fast_import_commit
+
+# create_card keyword arguments a row may set
+CARD_FIELDS = (
+    'name', 'phone', 'phone2', 'email', 'instagram', 'linkedin', 'twitter',
+    'youtube', 'tiktok', 'snapchat', 'github', 'website', 'custom_link',
+    'job_title', 'company', 'bio', 'template', 'photo', 'cv'
+)
+
+# Per-process generator, created once by the pool initializer
+_worker_generator = None
+
+
+def _init_worker(repo_path: str):
+    global _worker_generator
+    _worker_generator = CardGenerator(repo_path)
+
+
+def _create_one(fields: Dict) -> Dict:
+    return _worker_generator.create_card(**fields)
+
+
+def read_rows(path: Path, fmt: str = None) -> List[Tuple[int, Dict]]:
+    """(line number, row) pairs from a CSV file (with header) or NDJSON file"""
+    path = Path(path)
+    fmt = fmt or ('csv' if path.suffix.lower() == '.csv' else 'ndjson')
+    rows = []
+
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                rows.append((reader.line_num, row))
+        else:
+            for line_num, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    row = {'_error': f'Bad JSON: {e}'}
+                if not isinstance(row, dict):
+                    row = {'_error': 'Row is not a JSON object'}
+                rows.append((line_num, row))
+
+    return rows
+
+
+def row_fields(row: Dict, template: str = None) -> Dict:
+    """create_card arguments for one row (column names are case-insensitive)"""
+    if '_error' in row:
+        raise ValueError(row['_error'])
+
+    fields = {}
+    for key, value in row.items():
+        key = (key or '').strip().lower()
+        if key in CARD_FIELDS and value is not None:
+            fields[key] = str(value).strip()
+
+    if not fields.get('name'):
+        raise ValueError('Name is required')
+    if template and not fields.get('template'):
+        fields['template'] = template
+    fields['source'] = 'import'
+    return fields
+
+
+def import_rows(
+    generator: CardGenerator,
+    rows: List[Tuple[int, Dict]],
+    template: str = None,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[int, int, float], None]] = None,
+    commit: bool = True,
+    message: str = None
+) -> Dict:
+    """Create cards for all rows across a process pool
+
+    Usernames are reserved up front so parallel workers never collide. A bad
+    row is recorded in `failed` and the rest of the batch carries on. All new
+    card directories then go into the clients repo as a single commit.
+    """
+    total = len(rows)
+    workers = workers or os.cpu_count() or 1
+    failed = []
+    created = []
+    jobs = []
+    reserved = set()
+    start = time.time()
+
+    for line_num, row in rows:
+        try:
+            fields = row_fields(row, template)
+        except ValueError as e:
+            failed.append({'line': line_num, 'error': str(e)})
+            continue
+
+        base_username = generator.sanitize_username(fields['name'])
+        username = generator.get_unique_username(base_username)
+        counter = 1
+        while username in reserved:
+            username = generator.get_unique_username(f"{base_username}-{counter}")
+            counter += 1
+        reserved.add(username)
+        fields['username'] = username
+        jobs.append((line_num, fields))
+
+    done = len(failed)
+    if progress and done:
+        progress(done, total, time.time() - start)
+
+    if jobs:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(jobs)),
+            initializer=_init_worker,
+            initargs=(str(generator.repo_path),)
+        ) as pool:
+            futures = {pool.submit(_create_one, fields): (line_num, fields) for line_num, fields in jobs}
+
+            for future in as_completed(futures):
+                line_num, fields = futures[future]
+                try:
+                    created.append(future.result()['username'])
+                except Exception as e:
+                    failed.append({'line': line_num, 'name': fields['name'], 'error': str(e)})
+
+                done += 1
+                if progress:
+                    progress(done, total, time.time() - start)
+
+    commit_id = None
+    commit_error = None
+    if commit and created:
+        created.sort()
+        try:
+            # Waits for a running web app's git sync instead of racing its pull --rebase
+            with generator.git_sync.git_lock():
+                commit_id = fast_import_commit(
+                    generator.clients_path,
+                    created,
+                    message or f"Bulk import: {len(created)} cards"
+                )
+        except Exception as e:
+            commit_error = str(e)
+
+    failed.sort(key=lambda f: f['line'])
+    elapsed = time.time() - start
+    return {
+        'total': total,
+        'created': created,
+        'failed': failed,
+        'commit': commit_id,
+        'commit_error': commit_error,
+        'elapsed': round(elapsed, 3),
+        'rows_per_second': round(total / elapsed, 1) if elapsed > 0 else 0.0
+    }
+
+
+def print_progress(done: int, total: int, elapsed: float):
+    rate = done / elapsed if elapsed > 0 else 0.0
+    print(f"\r📥 {done}/{total} rows ({rate:.1f} rows/s)", end='', flush=True)
+    if done == total:
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create cards in bulk from CSV or NDJSON")
+    parser.add_argument('file', help="CSV (with a header row) or NDJSON file, one card per row")
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help="Input format (default: from the file extension)")
+    parser.add_argument('--template', help="Template for rows that do not name one")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: all cores)")
+    parser.add_argument('--message', help="Commit message")
+    parser.add_argument('--no-commit', action='store_true', help="Only write the cards, do not commit them")
+    parser.add_argument('--push', action='store_true', help="Push the commit to the cards data repo "
+                        "(the commit and push wait for the web app's git sync if one is running)")
+    args = parser.parse_args()
+
+    generator = CardGenerator()
+    result = import_rows(
+        generator,
+        read_rows(args.file, args.format),
+        template=args.template,
+        workers=args.workers,
+        progress=print_progress,
+        commit=not args.no_commit,
+        message=args.message
+    )
+
+    print(f"✅ Imported {len(result['created'])}/{result['total']} rows "
+          f"in {result['elapsed']:.1f}s ({result['rows_per_second']} rows/s)")
+    for failure in result['failed']:
+        print(f"⚠️ Line {failure['line']}: {failure['error']}")
+
+    if result['commit_error']:
+        print(f"❌ Commit failed: {result['commit_error']}")
+        sys.exit(1)
+    if result['commit']:
+        print(f"📦 Committed {result['commit'][:10]}")
+        if args.push:
+            with generator.git_sync.git_lock():
+                ok, detail = generator.git_sync.sync(args.message or 'Bulk import', [])
+            if not ok:
+                print("⚠️ Push failed; the commit goes out with the next sync")
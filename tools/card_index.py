@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Maroof - Card Index
+In-memory summary records of all cards, kept in sync with clients/
+"""
+
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+CARD_BASE_URL = 'https://maroof-id.github.io/maroof-cards-data'
+
+# Fields /api/cards can sort by
+SORT_KEYS = ('created_at', 'name', 'status', 'source', 'template', 'print_count')
+
+
+def card_summary(username: str, data: Dict) -> Dict:
+    """Summary record returned by list_cards"""
+    return {
+        'username': username,
+        'name': data.get('NAME', ''),
+        'phone': data.get('PHONE', ''),
+        'status': data.get('status', 'pending'),
+        'source': data.get('source', 'admin'),
+        'template': data.get('template', 'professional'),
+        'print_count': data.get('print_count', 0),
+        'created_at': data.get('created_at', ''),
+        'processing': data.get('assets') == 'processing',
+        'url': f'{CARD_BASE_URL}/{username}/'
+    }
+
+
+class CardIndex:
+    """Resident index of card summaries
+
+    Card operations update it directly. Edits made outside the app (git pull,
+    manual changes) are picked up by an mtime sweep, run when the clients
+    directory changes or at most every `check_interval` seconds.
+    """
+
+    def __init__(self, clients_path: Path, check_interval: float = 10.0):
+        self.clients_path = Path(clients_path)
+        self.check_interval = check_interval
+        self._entries: Dict[str, tuple] = {}
+        self._counts: Dict[str, int] = {}
+        self._sorted: Optional[List[Dict]] = None
+        self._version = 0
+        self._dir_mtime = None
+        self._last_check = 0.0
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _read(self, username: str) -> Optional[tuple]:
+        data_file = self.clients_path / username / 'data.json'
+        try:
+            mtime = data_file.stat().st_mtime_ns
+            with open(data_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            print(f"⚠️ Skipping {username}: bad data.json ({e})")
+            return None
+        return mtime, card_summary(username, data)
+
+    def _set(self, username: str, record: tuple):
+        """Store a record, moving the status counters with it"""
+        previous = self._entries.get(username)
+        if previous:
+            self._counts[previous[1]['status']] -= 1
+        status = record[1]['status']
+        self._counts[status] = self._counts.get(status, 0) + 1
+        self._entries[username] = record
+        self._sorted = None
+        self._version += 1
+
+    def _drop(self, username: str):
+        previous = self._entries.pop(username, None)
+        if previous:
+            self._counts[previous[1]['status']] -= 1
+            self._sorted = None
+            self._version += 1
+
+    def _sweep(self):
+        """Reload only cards whose data.json mtime changed"""
+        seen = set()
+
+        for entry in os.scandir(self.clients_path):
+            if entry.name.startswith('.') or not entry.is_dir():
+                continue
+            try:
+                mtime = os.stat(os.path.join(entry.path, 'data.json')).st_mtime_ns
+            except FileNotFoundError:
+                continue
+
+            seen.add(entry.name)
+            cached = self._entries.get(entry.name)
+            if cached is None or cached[0] != mtime:
+                record = self._read(entry.name)
+                if record:
+                    self._set(entry.name, record)
+
+        for username in list(self._entries):
+            if username not in seen:
+                self._drop(username)
+
+    def _sync(self):
+        try:
+            dir_mtime = self.clients_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._entries.clear()
+            self._counts.clear()
+            self._sorted = None
+            self._version += 1
+            return
+
+        now = time.monotonic()
+        if self._loaded and dir_mtime == self._dir_mtime and now - self._last_check < self.check_interval:
+            return
+
+        self._sweep()
+        self._dir_mtime = dir_mtime
+        self._last_check = now
+        self._loaded = True
+
+    def refresh(self, username: str):
+        """Re-read one card after it was written"""
+        with self._lock:
+            if not self._loaded:
+                return
+            record = self._read(username)
+            if record:
+                self._set(username, record)
+            else:
+                self._drop(username)
+
+    def remove(self, username: str):
+        with self._lock:
+            self._drop(username)
+
+    def version(self) -> int:
+        """Counter that moves whenever any card changes"""
+        with self._lock:
+            self._sync()
+            return self._version
+
+    def rebuild(self) -> int:
+        """Drop everything and reload from disk (recovery)"""
+        with self._lock:
+            self._entries.clear()
+            self._counts.clear()
+            self._sorted = None
+            self._version += 1
+            self._loaded = False
+            self._sync()
+            return len(self._entries)
+
+    def cards(self, status_filter: str = None) -> List[Dict]:
+        """Summaries sorted newest first (records are shared, do not mutate)"""
+        with self._lock:
+            self._sync()
+            if self._sorted is None:
+                self._sorted = sorted(
+                    (record for _, record in self._entries.values()),
+                    key=lambda x: x.get('created_at', ''),
+                    reverse=True
+                )
+            cards = self._sorted
+
+        if status_filter is None:
+            return list(cards)
+        return [c for c in cards if c['status'] == status_filter]
+
+    def stats(self) -> Dict[str, int]:
+        """Card counts per status, maintained as cards change"""
+        with self._lock:
+            self._sync()
+            stats = {'pending': 0, 'printed': 0, 'modified': 0}
+            stats.update({status: count for status, count in self._counts.items() if count})
+            stats['total'] = len(self._entries)
+            return stats
+
+    def query(
+        self,
+        status: str = None,
+        source: str = None,
+        template: str = None,
+        created_from: str = None,
+        created_to: str = None,
+        search: str = None,
+        sort: str = 'created_at',
+        descending: bool = True,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> Tuple[List[Dict], int]:
+        """Filtered, sorted window of summaries plus the total match count"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f'Invalid sort key: {sort}')
+
+        cards = self.cards(status)
+
+        if source:
+            cards = [c for c in cards if c['source'] == source]
+        if template:
+            cards = [c for c in cards if c['template'] == template]
+        if created_from:
+            cards = [c for c in cards if c['created_at'] >= created_from]
+        if created_to:
+            # Prefix compare so a plain date includes the whole day
+            cards = [c for c in cards if c['created_at'][:len(created_to)] <= created_to]
+        if search:
+            needle = search.lower()
+            cards = [
+                c for c in cards
+                if needle in c['name'].lower() or needle in c['phone'] or needle in c['username']
+            ]
+
+        # Already newest first; other orders need a sort
+        if sort != 'created_at' or not descending:
+            cards.sort(key=lambda c: c[sort], reverse=descending)
+
+        total = len(cards)
+        end = None if limit is None else offset + limit
+        return cards[offset:end], total
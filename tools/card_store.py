@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Maroof - SQLite Card Store
+Optional indexed metadata store for cards; data.json stays the published export
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import time
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from card_index import CARD_BASE_URL, SORT_KEYS, card_summary
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    username TEXT PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    phone TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'pending',
+    source TEXT NOT NULL DEFAULT 'admin',
+    template TEXT NOT NULL DEFAULT 'professional',
+    print_count INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL DEFAULT '',
+    processing INTEGER NOT NULL DEFAULT 0,
+    mtime INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_cards_status_created ON cards(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_cards_source ON cards(source);
+CREATE INDEX IF NOT EXISTS idx_cards_template ON cards(template);
+CREATE INDEX IF NOT EXISTS idx_cards_created ON cards(created_at);
+
+CREATE TABLE IF NOT EXISTS print_history (
+    username TEXT NOT NULL REFERENCES cards(username) ON DELETE CASCADE,
+    date TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_print_history_username ON print_history(username);
+
+-- Status counters kept current by triggers on every card change
+CREATE TABLE IF NOT EXISTS status_counts (
+    status TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS cards_count_insert AFTER INSERT ON cards BEGIN
+    INSERT INTO status_counts (status, count) VALUES (NEW.status, 1)
+        ON CONFLICT(status) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cards_count_delete AFTER DELETE ON cards BEGIN
+    UPDATE status_counts SET count = count - 1 WHERE status = OLD.status;
+END;
+CREATE TRIGGER IF NOT EXISTS cards_count_update AFTER UPDATE OF status ON cards
+    WHEN OLD.status != NEW.status BEGIN
+    UPDATE status_counts SET count = count - 1 WHERE status = OLD.status;
+    INSERT INTO status_counts (status, count) VALUES (NEW.status, 1)
+        ON CONFLICT(status) DO UPDATE SET count = count + 1;
+END;
+
+-- Bumped on every card change, by any process writing the database
+CREATE TABLE IF NOT EXISTS store_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_version (id, version) VALUES (1, 0);
+CREATE TRIGGER IF NOT EXISTS cards_version_insert AFTER INSERT ON cards BEGIN
+    UPDATE store_version SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cards_version_update AFTER UPDATE ON cards BEGIN
+    UPDATE store_version SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cards_version_delete AFTER DELETE ON cards BEGIN
+    UPDATE store_version SET version = version + 1;
+END;
+"""
+
+CARD_COLUMNS = ('username', 'name', 'phone', 'status', 'source', 'template', 'print_count', 'created_at', 'processing')
+
+# Columns added after the first release: name -> definition
+ADDED_COLUMNS = {
+    'processing': 'INTEGER NOT NULL DEFAULT 0',
+    'mtime': 'INTEGER NOT NULL DEFAULT 0',
+}
+
+
+class CardStore:
+    """SQLite-backed card metadata with the same interface as CardIndex
+
+    Each row keeps the mtime of the data.json it came from, so edits made
+    outside the app (git pull, manual changes) are picked up by the same
+    sweep CardIndex runs: when the clients directory changes or at most
+    every `check_interval` seconds.
+    """
+
+    def __init__(self, db_path: Path, clients_path: Path, check_interval: float = 10.0):
+        self.db_path = Path(db_path)
+        self.clients_path = Path(clients_path)
+        self.check_interval = check_interval
+        self._dir_mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA foreign_keys=ON')
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self.rebuild_stats()
+
+    def _migrate(self):
+        """Add columns introduced after the database was created"""
+        columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(cards)')}
+        for name, definition in ADDED_COLUMNS.items():
+            if name not in columns:
+                with self._conn:
+                    self._conn.execute(f'ALTER TABLE cards ADD COLUMN {name} {definition}')
+
+    def _read(self, username: str) -> Optional[Tuple[int, Dict]]:
+        """(mtime, data) of a card's data.json, or None if missing/unreadable"""
+        data_file = self.clients_path / username / 'data.json'
+        try:
+            mtime = data_file.stat().st_mtime_ns
+            with open(data_file, 'r', encoding='utf-8') as f:
+                return mtime, json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            print(f"⚠️ Skipping {username}: bad data.json ({e})")
+            return None
+
+    def _upsert(self, username: str, data: Dict, mtime: int):
+        summary = card_summary(username, data)
+        summary['mtime'] = mtime
+        columns = CARD_COLUMNS + ('mtime',)
+        self._conn.execute(
+            f"INSERT INTO cards ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT(username) DO UPDATE SET "
+            f"{', '.join(f'{c} = excluded.{c}' for c in columns[1:])}",
+            [summary[c] for c in columns]
+        )
+        self._conn.execute('DELETE FROM print_history WHERE username = ?', (username,))
+        self._conn.executemany(
+            'INSERT INTO print_history (username, date, count) VALUES (?, ?, ?)',
+            [(username, h.get('date', ''), h.get('count', 0)) for h in data.get('print_history', [])]
+        )
+
+    def refresh(self, username: str):
+        """Sync one card from its data.json export"""
+        record = self._read(username)
+        with self._lock, self._conn:
+            if record is None:
+                self._conn.execute('DELETE FROM cards WHERE username = ?', (username,))
+            else:
+                self._upsert(username, record[1], record[0])
+
+    def remove(self, username: str):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM cards WHERE username = ?', (username,))
+
+    def version(self) -> int:
+        """Counter that moves whenever any process changes a card (kept by triggers)"""
+        self._sync()
+        with self._lock:
+            return self._conn.execute('SELECT version FROM store_version').fetchone()[0]
+
+    def _sweep(self):
+        """Reload only cards whose data.json mtime differs from the stored one"""
+        with self._lock, self._conn:
+            stored = dict(self._conn.execute('SELECT username, mtime FROM cards').fetchall())
+            seen = set()
+
+            for username in self._disk_usernames():
+                try:
+                    mtime = os.stat(os.path.join(self.clients_path, username, 'data.json')).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+
+                seen.add(username)
+                if stored.get(username) != mtime:
+                    record = self._read(username)
+                    if record:
+                        self._upsert(username, record[1], record[0])
+
+            for username in stored.keys() - seen:
+                self._conn.execute('DELETE FROM cards WHERE username = ?', (username,))
+
+    def _sync(self):
+        try:
+            dir_mtime = self.clients_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            dir_mtime = None
+
+        now = time.monotonic()
+        if dir_mtime == self._dir_mtime and now - self._last_check < self.check_interval:
+            return
+
+        self._sweep()
+        self._dir_mtime = dir_mtime
+        self._last_check = now
+
+    def cards(self, status_filter: str = None) -> List[Dict]:
+        """Summaries sorted newest first"""
+        return self.query(status=status_filter)[0]
+
+    def query(
+        self,
+        status: str = None,
+        source: str = None,
+        template: str = None,
+        created_from: str = None,
+        created_to: str = None,
+        search: str = None,
+        sort: str = 'created_at',
+        descending: bool = True,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> Tuple[List[Dict], int]:
+        """Filtered, sorted window of summaries plus the total match count"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f'Invalid sort key: {sort}')
+
+        where = []
+        params = []
+        for column, value in (('status', status), ('source', source), ('template', template)):
+            if value:
+                where.append(f'{column} = ?')
+                params.append(value)
+        if created_from:
+            where.append('created_at >= ?')
+            params.append(created_from)
+        if created_to:
+            # Prefix compare so a plain date includes the whole day
+            where.append('substr(created_at, 1, ?) <= ?')
+            params.extend([len(created_to), created_to])
+        if search:
+            where.append("(name LIKE ? ESCAPE '\\' OR phone LIKE ? ESCAPE '\\' OR username LIKE ? ESCAPE '\\')")
+            pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            params.extend([pattern, pattern, pattern])
+
+        where_sql = f" WHERE {' AND '.join(where)}" if where else ''
+        order_sql = f" ORDER BY {sort} {'DESC' if descending else 'ASC'}, username"
+        window_params = [-1 if limit is None else limit, offset]
+
+        self._sync()
+        with self._lock:
+            total = self._conn.execute(f'SELECT COUNT(*) FROM cards{where_sql}', params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {', '.join(CARD_COLUMNS)} FROM cards{where_sql}{order_sql} LIMIT ? OFFSET ?",
+                params + window_params
+            ).fetchall()
+
+        cards = []
+        for row in rows:
+            card = dict(row)
+            card['processing'] = bool(card['processing'])
+            card['url'] = f"{CARD_BASE_URL}/{card['username']}/"
+            cards.append(card)
+        return cards, total
+
+    def stats(self) -> Dict[str, int]:
+        """Card counts per status, maintained by triggers"""
+        self._sync()
+        with self._lock:
+            rows = self._conn.execute('SELECT status, count FROM status_counts WHERE count > 0').fetchall()
+        stats = {'pending': 0, 'printed': 0, 'modified': 0}
+        stats.update({status: count for status, count in rows})
+        stats['total'] = sum(count for _, count in rows)
+        return stats
+
+    def rebuild_stats(self):
+        """Recount status counters from the cards table"""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM status_counts')
+            self._conn.execute(
+                'INSERT INTO status_counts (status, count) SELECT status, COUNT(*) FROM cards GROUP BY status'
+            )
+
+    def rebuild(self) -> int:
+        """Re-import every card from disk (recovery)"""
+        return self.import_tree()
+
+    def print_history(self, username: str) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT date, count FROM print_history WHERE username = ? ORDER BY rowid',
+                (username,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _disk_usernames(self) -> List[str]:
+        try:
+            entries = list(os.scandir(self.clients_path))
+        except FileNotFoundError:
+            return []
+        return sorted(
+            entry.name for entry in entries
+            if entry.is_dir() and not entry.name.startswith('.')
+            and os.path.exists(os.path.join(entry.path, 'data.json'))
+        )
+
+    def import_tree(self) -> int:
+        """Build the database from an existing clients/ tree"""
+        imported = 0
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM cards')
+            for username in self._disk_usernames():
+                record = self._read(username)
+                if record is not None:
+                    self._upsert(username, record[1], record[0])
+                    imported += 1
+        return imported
+
+    def check(self, fix: bool = False) -> Dict[str, List[str]]:
+        """Compare the database against data.json files"""
+        report = {'missing_in_db': [], 'missing_on_disk': [], 'mismatched': []}
+
+        with self._lock:
+            db_usernames = {row[0] for row in self._conn.execute('SELECT username FROM cards')}
+
+        disk_usernames = self._disk_usernames()
+        for username in disk_usernames:
+            if username not in db_usernames:
+                report['missing_in_db'].append(username)
+                continue
+
+            record = self._read(username)
+            if record is None:
+                continue
+            data = record[1]
+            expected = card_summary(username, data)
+            expected.pop('url')
+            expected_history = [
+                {'date': h.get('date', ''), 'count': h.get('count', 0)}
+                for h in data.get('print_history', [])
+            ]
+
+            with self._lock:
+                row = self._conn.execute(
+                    f"SELECT {', '.join(CARD_COLUMNS)} FROM cards WHERE username = ?", (username,)
+                ).fetchone()
+            if dict(row) != expected or self.print_history(username) != expected_history:
+                report['mismatched'].append(username)
+
+        report['missing_on_disk'] = sorted(db_usernames - set(disk_usernames))
+
+        if fix:
+            for username in report['missing_in_db'] + report['mismatched'] + report['missing_on_disk']:
+                self.refresh(username)
+
+        return report
+
+
+def get_store_path(repo_path: Path) -> Path:
+    return Path(repo_path) / 'cards.db'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the SQLite card store")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('migrate', help="Build cards.db from clients/ (enables the SQLite backend)")
+    check_parser = sub.add_parser('check', help="Compare cards.db with data.json files")
+    check_parser.add_argument('--fix', action='store_true', help="Re-import inconsistent cards")
+    args = parser.parse_args()
+
+    repo_path = Path(__file__).resolve().parent.parent
+    store = CardStore(get_store_path(repo_path), repo_path / 'clients')
+
+    if args.command == 'migrate':
+        count = store.import_tree()
+        print(f"✅ Imported {count} cards into {store.db_path}")
+    else:
+        report = store.check(fix=args.fix)
+        problems = sum(len(v) for v in report.values())
+        for kind, usernames in report.items():
+            if usernames:
+                print(f"⚠️ {kind}: {', '.join(usernames)}")
+        if problems == 0:
+            print("✅ cards.db is consistent with clients/")
+        elif args.fix:
+            print(f"🔧 Fixed {problems} cards")
+        else:
+            sys.exit(1)
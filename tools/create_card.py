@@ -9,13 +9,33 @@ import re
 import json
 import subprocess
 import base64
+import os
+import time
+import fcntl
+import uuid
+import shutil
 import threading
 from pathlib import Path
-from typing import Dict, Optional, Tuple, List
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple, List, Union
 from datetime import datetime
 
-class CardGenerator:
-    """Generates digital business cards"""
+from template_engine import compile_cached, get_registry
+from card_index import CardIndex, card_summary
+from card_store import CardStore, get_store_path
+from event_bus import EventBus
+from git_sync import GitSyncWorker
+from git_maintenance import GitMaintenance
+from photo_variants import PHOTO_BUDGET_BYTES, build_variants, compress_photo_to_budget, srcset_fields
+from media_store import MediaStore, digest_of
+import build_pkpass as pkpass
+
+class CardRenderer:
+    """Renders a card's outputs (index.html, contact.vcf, .pkpass) from its data.json
+
+    Cheap to create: re-render workers use it instead of a full CardGenerator,
+    which would also load the card index and start the git sync worker.
+    """
 
     def __init__(self, repo_path: str = None):
         if repo_path is None:
@@ -27,21 +47,252 @@ class CardGenerator:
         self.templates_path = self.repo_path / "templates"
         self.clients_path = self.repo_path / "clients"
 
+        self.template_registry = get_registry(self.templates_path / "cards")
+
+        # Per-card locks around data.json read-modify-write, shared with other
+        # processes (re-render workers) through lock files outside clients/
+        self.locks_path = self.repo_path / '.card_locks'
+        self._card_locks: Dict[str, threading.Lock] = {}
+        self._card_locks_lock = threading.Lock()
+
+    @contextmanager
+    def card_lock(self, username: str) -> Iterator[None]:
+        """Held while a card's data.json is read, changed and its outputs written"""
+        with self._card_locks_lock:
+            lock = self._card_locks.setdefault(username, threading.Lock())
+
+        with lock:
+            self.locks_path.mkdir(exist_ok=True)
+            fd = os.open(self.locks_path / f'{username}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def format_phone_international(self, phone: str) -> str:
+        """Convert phone to international format"""
+        phone = re.sub(r'\D', '', phone)
+
+        if phone.startswith('00966'):
+            return phone[2:]
+        elif phone.startswith('966'):
+            return phone
+        elif phone.startswith('0'):
+            return '966' + phone[1:]
+        else:
+            return '966' + phone
+
+    def load_template(self, template_name: str) -> str:
+        """Load HTML template"""
+        entry = self.template_registry.get(template_name)
+
+        if entry is None:
+            print(f"⚠️ Template not found: {template_name}, using professional")
+            entry = self.template_registry.get('professional')
+            
+        if entry is None:
+            raise FileNotFoundError(f"Template not found: {template_name}")
+
+        return entry[0]
+
+    def replace_variables(self, html: str, data: Dict[str, str]) -> str:
+        """Replace variables in HTML template"""
+
+        # Format phone numbers
+        if 'PHONE' in data and data['PHONE']:
+            data['PHONE_INTL'] = self.format_phone_international(data['PHONE'])
+        
+        if 'PHONE2' in data and data['PHONE2']:
+            data['PHONE2_INTL'] = self.format_phone_international(data['PHONE2'])
+
+        # Get name initial
+        if 'NAME' in data and data['NAME']:
+            data['NAME_INITIAL'] = data['NAME'][0].upper()
+
+        # Render compiled template in a single pass
+        return compile_cached(html).render(data)
+
+    def render_html(self, template_name: str, data: Dict) -> str:
+        """Render card HTML, falling back to professional on template errors"""
+        try:
+            html = self.load_template(template_name)
+            return self.replace_variables(html, data)
+        except Exception as e:
+            print(f"⚠️ Template error: {e}")
+            html = self.load_template('professional')
+            return self.replace_variables(html, data)
+
+    def get_card_data(self, username: str) -> Optional[Dict]:
+        """Load card data"""
+        data_file = self.clients_path / username / 'data.json'
+        if not data_file.exists():
+            return None
+        with open(data_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def rerender_card(self, username: str) -> bool:
+        """Regenerate index.html from saved card data"""
+        with self.card_lock(username):
+            data = self.get_card_data(username)
+            if data is None:
+                return False
+
+            html = self.render_html(data.get('template', 'professional'), data)
+
+            output_file = self.clients_path / username / 'index.html'
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(html)
+
+        return True
+
+    def _create_vcard(self, data: Dict[str, str], username: str, client_dir: Path):
+        """Create vCard file with all contact info"""
+        vcard_lines = [
+            'BEGIN:VCARD',
+            'VERSION:3.0',
+            f'FN:{data.get("NAME", "")}',
+            f'N:{data.get("NAME", "")};;;;',
+        ]
+        
+        # Job title & Company
+        if data.get('JOB_TITLE') or data.get('COMPANY'):
+            title = data.get('JOB_TITLE', '')
+            org = data.get('COMPANY', '')
+            if title:
+                vcard_lines.append(f'TITLE:{title}')
+            if org:
+                vcard_lines.append(f'ORG:{org}')
+        
+        # Photo
+        if data.get('PHOTO') and data['PHOTO'].startswith('./'):
+            photo_url = f'https://maroof-id.github.io/maroof-cards-data/{username}/{data["PHOTO"][2:]}'
+            vcard_lines.append(f'PHOTO;VALUE=URL;TYPE=JPEG:{photo_url}')
+        
+        # Phone numbers
+        if data.get('PHONE_INTL'):
+            vcard_lines.append(f'TEL;TYPE=CELL:+{data["PHONE_INTL"]}')
+        elif data.get('PHONE'):
+            vcard_lines.append(f'TEL;TYPE=CELL:{data["PHONE"]}')
+        
+        if data.get('PHONE2_INTL'):
+            vcard_lines.append(f'TEL;TYPE=CELL:+{data["PHONE2_INTL"]}')
+        elif data.get('PHONE2'):
+            vcard_lines.append(f'TEL;TYPE=CELL:{data["PHONE2"]}')
+        
+        # Email
+        if data.get('EMAIL'):
+            vcard_lines.append(f'EMAIL;TYPE=INTERNET:{data["EMAIL"]}')
+        
+        # Website
+        if data.get('WEBSITE'):
+            vcard_lines.append(f'URL;TYPE=Website:{data["WEBSITE"]}')
+        
+        # Social media
+        if data.get('INSTAGRAM'):
+            vcard_lines.append(f'URL;TYPE=Instagram:https://instagram.com/{data["INSTAGRAM"]}')
+        
+        if data.get('LINKEDIN'):
+            vcard_lines.append(f'URL;TYPE=LinkedIn:https://linkedin.com/in/{data["LINKEDIN"]}')
+        
+        if data.get('TWITTER'):
+            vcard_lines.append(f'URL;TYPE=Twitter:https://twitter.com/{data["TWITTER"]}')
+        
+        if data.get('YOUTUBE'):
+            youtube = data['YOUTUBE']
+            if youtube.startswith('http'):
+                vcard_lines.append(f'URL;TYPE=YouTube:{youtube}')
+            else:
+                vcard_lines.append(f'URL;TYPE=YouTube:https://youtube.com/@{youtube}')
+        
+        if data.get('TIKTOK'):
+            vcard_lines.append(f'URL;TYPE=TikTok:https://tiktok.com/@{data["TIKTOK"]}')
+        
+        if data.get('SNAPCHAT'):
+            vcard_lines.append(f'URL;TYPE=Snapchat:https://snapchat.com/add/{data["SNAPCHAT"]}')
+        
+        if data.get('GITHUB'):
+            vcard_lines.append(f'URL;TYPE=GitHub:https://github.com/{data["GITHUB"]}')
+        
+        # Custom link
+        if data.get('CUSTOM_LINK'):
+            vcard_lines.append(f'URL;TYPE=Custom:{data["CUSTOM_LINK"]}')
+        
+        # CV
+        if data.get('CV') and data['CV'].startswith('./'):
+            cv_url = f'https://maroof-id.github.io/maroof-cards-data/{username}/{data["CV"][2:]}'
+            vcard_lines.append(f'URL;TYPE=CV:{cv_url}')
+        
+        # Card URL
+        vcard_lines.append(f'URL:https://maroof-id.github.io/maroof-cards-data/{username}/')
+        
+        # Bio
+        if data.get('BIO'):
+            vcard_lines.append(f'NOTE:{data["BIO"]}')
+        
+        vcard_lines.append('END:VCARD')
+        
+        vcard_path = client_dir / 'contact.vcf'
+        with open(vcard_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(vcard_lines))
+        
+        return vcard_path
+
+    def build_pkpass(self, username: str, data: Optional[Dict] = None) -> bool:
+        """Generate .pkpass for Apple Wallet (in-process; `data` saves re-reading data.json)"""
+        try:
+            if pkpass.build_pkpass(username, data, self.clients_path) is None:
+                return False
+            print(f"✅ Generated .pkpass for {username}")
+            return True
+        except Exception as e:
+            print(f"⚠️ Failed to generate .pkpass: {e}")
+            return False
+
+
+class CardGenerator(CardRenderer):
+    """Generates digital business cards"""
+
+    def __init__(self, repo_path: str = None):
+        super().__init__(repo_path)
+
         self.clients_path.mkdir(parents=True, exist_ok=True)
         self.templates_path.mkdir(parents=True, exist_ok=True)
 
+        # SQLite metadata store once cards.db has been migrated, else in-memory index
+        store_path = get_store_path(self.repo_path)
+        if store_path.exists():
+            self.card_index = CardStore(store_path, self.clients_path)
+        else:
+            self.card_index = CardIndex(self.clients_path)
+
+        # Change feed for /api/events
+        self.events = EventBus()
+
+        # Process pool for photo variants (set by the web app; None encodes inline)
+        self.media_pool = None
+
+        # Processed uploads by content hash (identical re-uploads are no-ops)
+        self.media_store = MediaStore(self.repo_path / '.media_cache')
+
+        # Background queue for photo/.pkpass work (set by the web app; None builds inline)
+        self.media_jobs = None
+        self.uploads_path = self.repo_path / '.media_uploads'
+
+        # Single background worker for clients repo commits/pushes
+        self.git_sync = GitSyncWorker(
+            self.clients_path,
+            self.repo_path / 'git_push.log',
+            outbox_file=self.repo_path / '.git_outbox.json',
+            on_result=self._publish_sync_result,
+            maintenance=GitMaintenance(self.clients_path, self.repo_path / '.git_maintenance.json'),
+            lock_file=self.repo_path / '.git_sync.lock'
+        )
+
     def get_available_templates(self) -> List[str]:
         """Get list of available templates from templates/cards/"""
-        templates_dir = self.templates_path / "cards"
-        if not templates_dir.exists():
-            return ['professional']
-        
-        templates = []
-        for file in templates_dir.glob("*.html"):
-            template_name = file.stem
-            templates.append(template_name)
-        
-        return sorted(templates) if templates else ['professional']
+        templates = self.template_registry.names()
+        return templates if templates else ['professional']
 
     def sanitize_username(self, name: str) -> str:
         """Convert Arabic/English name to safe username"""
@@ -85,104 +336,169 @@ class CardGenerator:
 
         return username
 
-    def format_phone_international(self, phone: str) -> str:
-        """Convert phone to international format"""
-        phone = re.sub(r'\D', '', phone)
-
-        if phone.startswith('00966'):
-            return phone[2:]
-        elif phone.startswith('966'):
-            return phone
-        elif phone.startswith('0'):
-            return '966' + phone[1:]
-        else:
-            return '966' + phone
+    def compress_image(self, image_bytes: Union[bytes, Path], digest: Optional[str] = None) -> bytes:
+        """Compress image to fit the photo byte budget (raw bytes or an uploaded file on disk)
 
-    def compress_image(self, image_bytes: bytes, image_format: str) -> bytes:
-        """Compress image to reduce size"""
+        The quality chosen for an upload is remembered by its `digest`.
+        """
         try:
-            from PIL import Image
-            from io import BytesIO
-            
-            img = Image.open(BytesIO(image_bytes))
-            
-            if img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-            
-            max_size = (800, 800)
-            if img.width > max_size[0] or img.height > max_size[1]:
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-            
-            output = BytesIO()
-            img.save(output, format='JPEG', quality=85, optimize=True)
-            return output.getvalue()
-            
+            params = self.media_store.get_params('photo', digest) if digest else None
+            compressed, params = compress_photo_to_budget(image_bytes, PHOTO_BUDGET_BYTES, params=params)
+            if digest:
+                self.media_store.set_params('photo', digest, params)
+            return compressed
         except ImportError:
             print("⚠️ Pillow not installed")
-            return image_bytes
+            return image_bytes.read_bytes() if isinstance(image_bytes, Path) else image_bytes
         except Exception as e:
             print(f"⚠️ Compression failed: {e}")
-            return image_bytes
-
-    def load_template(self, template_name: str) -> str:
-        """Load HTML template"""
-        template_file = self.templates_path / "cards" / f"{template_name}.html"
-
-        if not template_file.exists():
-            print(f"⚠️ Template not found: {template_name}, using professional")
-            template_file = self.templates_path / "cards" / "professional.html"
-            
-        if not template_file.exists():
-            raise FileNotFoundError(f"Template not found: {template_name}")
-
-        with open(template_file, 'r', encoding='utf-8') as f:
-            return f.read()
+            return image_bytes.read_bytes() if isinstance(image_bytes, Path) else image_bytes
 
-    def replace_variables(self, html: str, data: Dict[str, str]) -> str:
-        """Replace variables in HTML template"""
+    def save_photo(self, client_dir: Path, photo: Union[str, Path]) -> str:
+        """Store a data URL or uploaded image file as photo.jpg; returns the card-relative path"""
+        if isinstance(photo, Path):
+            image_source = photo
+            original_size = photo.stat().st_size / 1024
+        else:
+            match = re.match(r'data:image/\w+;base64,(.+)', photo or '')
+            if not match:
+                return ''
+            image_source = base64.b64decode(match.group(1))
+            original_size = len(image_source) / 1024
+
+        photo_filename = 'photo.jpg'
+        photo_file = client_dir / photo_filename
+        digest = digest_of(image_source)
+        changed = self.media_store.place(
+            image_source, photo_file, 'photo',
+            derive=lambda source: self.compress_image(source, digest),
+            digest=digest
+        )
+
+        if changed:
+            compressed_size = photo_file.stat().st_size / 1024
+            print(f"✅ Photo: {original_size:.1f}KB → {compressed_size:.1f}KB")
+        else:
+            print("✅ Photo unchanged")
+        return f'./{photo_filename}'
+
+    def stash_photo(self, username: str, photo: Union[str, Path]) -> bool:
+        """Keep a raw photo upload outside clients/ until the card's media job picks it up
+
+        Every upload gets its own <username>.<time>.photo<suffix> file, so a
+        job still working on an earlier one never touches it (see _claim_photo).
+        Returns False when there is nothing to stash.
+        """
+        if isinstance(photo, Path):
+            suffix = photo.suffix.lower() or '.jpg'
+            photo_bytes = None
+        else:
+            match = re.match(r'data:image/(\w+);base64,(.+)', photo or '')
+            if not match:
+                return False
+            suffix = f'.{match.group(1).lower()}'
+            photo_bytes = base64.b64decode(match.group(2))
+
+        # Same photo as the card already has (and no other upload waiting): nothing to do
+        source = photo if photo_bytes is None else photo_bytes
+        pending = any(self.uploads_path.glob(f'{username}.*'))
+        if not pending and self.media_store.unchanged(source, self.clients_path / username / 'photo.jpg', 'photo'):
+            return False
 
-        # Format phone numbers
-        if 'PHONE' in data and data['PHONE']:
-            data['PHONE_INTL'] = self.format_phone_international(data['PHONE'])
-        
-        if 'PHONE2' in data and data['PHONE2']:
-            data['PHONE2_INTL'] = self.format_phone_international(data['PHONE2'])
+        self.uploads_path.mkdir(exist_ok=True)
+        stash_path = self.uploads_path / f'{username}.{time.time_ns():020d}.photo{suffix}'
+        # Written under a dot name so a job never claims a half-written file
+        tmp_path = self.uploads_path / f'.{stash_path.name}.{uuid.uuid4().hex}.tmp'
+        if photo_bytes is None:
+            shutil.copyfile(photo, tmp_path)
+        else:
+            tmp_path.write_bytes(photo_bytes)
+        os.replace(tmp_path, stash_path)
+        return True
 
-        # Get name initial
-        if 'NAME' in data and data['NAME']:
-            data['NAME_INITIAL'] = data['NAME'][0].upper()
+    def _claim_photo(self, username: str) -> Optional[Path]:
+        """Take the newest stashed upload for a card, dropping older ones it supersedes
 
-        # Replace all variables
-        for key, value in data.items():
-            if value:
-                html = html.replace(f'{{{{{key}}}}}', str(value))
+        The upload is renamed to .claimed first, so uploads stashed meanwhile
+        are left for the job they queued.
+        """
+        stashes = sorted(self.uploads_path.glob(f'{username}.*.photo*'))
+        if not stashes:
+            return None
+        newest = stashes[-1]
+        claimed = newest.with_name(newest.name.replace('.photo', '.claimed', 1))
+        try:
+            os.replace(newest, claimed)
+        except FileNotFoundError:
+            return None
+        for older in stashes[:-1]:
+            older.unlink(missing_ok=True)
+        return claimed
+
+    def _drop_stashed_photos(self, username: str):
+        for path in self.uploads_path.glob(f'{username}.*'):
+            path.unlink(missing_ok=True)
+
+    def build_photo_variants(self, client_dir: Path, data: Dict):
+        """Build (or reuse) responsive copies of the photo and set the srcset fields"""
+        manifest = None
+        if data.get('PHOTO'):
+            try:
+                manifest = build_variants(client_dir, pool=self.media_pool)
+            except Exception as e:
+                print(f"⚠️ Photo variants failed: {e}")
 
-        # Handle {{#if FIELD}} conditionals
-        for key, value in data.items():
+        for key, value in srcset_fields(manifest).items():
             if value:
-                pattern = f'{{{{#if {key}}}}}(.*?){{{{/if}}}}'
-                html = re.sub(pattern, r'\1', html, flags=re.DOTALL)
-            else:
-                pattern = f'{{{{#if {key}}}}}.*?{{{{/if}}}}'
-                html = re.sub(pattern, '', html, flags=re.DOTALL)
-
-        # Handle {{#if !FIELD}} conditionals
-        for key, value in data.items():
-            if not value:
-                pattern = f'{{{{#if !{key}}}}}(.*?){{{{/if}}}}'
-                html = re.sub(pattern, r'\1', html, flags=re.DOTALL)
+                data[key] = value
             else:
-                pattern = f'{{{{#if !{key}}}}}.*?{{{{/if}}}}'
-                html = re.sub(pattern, '', html, flags=re.DOTALL)
+                data.pop(key, None)
+
+    def apply_photo_variants(self, username: str, manifest: Optional[Dict]) -> bool:
+        """Store srcset fields built elsewhere and re-render; False if nothing changed"""
+        with self.card_lock(username):
+            data = self.get_card_data(username)
+            if data is None:
+                return False
+
+            fields = srcset_fields(manifest if data.get('PHOTO') else None)
+            if all(data.get(key, '') == value for key, value in fields.items()):
+                return False
+
+            for key, value in fields.items():
+                if value:
+                    data[key] = value
+                else:
+                    data.pop(key, None)
 
-        # Clean up remaining variables
-        html = re.sub(r'\{\{[^}]+\}\}', '', html)
+            with open(self.clients_path / username / 'data.json', 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.card_index.refresh(username)
 
-        return html
+            html = self.render_html(data.get('template', 'professional'), data)
+            with open(self.clients_path / username / 'index.html', 'w', encoding='utf-8') as f:
+                f.write(html)
+            return True
+
+    def save_cv(self, client_dir: Path, cv: Union[str, Path]) -> str:
+        """Store a data URL or uploaded PDF as cv.pdf; returns the card-relative path"""
+        cv_filename = 'cv.pdf'
+        cv_file_path = client_dir / cv_filename
+
+        if isinstance(cv, Path):
+            cv_source = cv
+        else:
+            match = re.match(r'data:application/pdf;base64,(.+)', cv or '')
+            if not match:
+                return ''
+            cv_source = base64.b64decode(match.group(1))
+
+        if self.media_store.place(cv_source, cv_file_path, 'cv'):
+            cv_size = cv_file_path.stat().st_size / 1024
+            print(f"✅ CV: {cv_size:.1f}KB")
+        else:
+            print("✅ CV unchanged")
+        return f'./{cv_filename}'
 
     def create_card(
         self,
@@ -204,11 +520,14 @@ class CardGenerator:
         bio: str = '',
         template: str = 'professional',
         username: Optional[str] = None,
-        photo: str = '',
-        cv: str = '',
+        photo: Union[str, Path] = '',
+        cv: Union[str, Path] = '',
         source: str = 'admin'
     ) -> Dict[str, str]:
-        """Create new business card"""
+        """Create new business card
+
+        `photo` and `cv` are data URLs or paths to uploaded files.
+        """
 
         if not name or not name.strip():
             raise ValueError('Name is required')
@@ -220,52 +539,26 @@ class CardGenerator:
         client_dir = self.clients_path / username
         client_dir.mkdir(exist_ok=True)
 
+        # Photo/.pkpass work goes to the media job queue when there is one
+        deferred = self.media_jobs is not None
+
         # Handle photo upload
         photo_path = ''
-        if photo and photo.startswith('data:image'):
+        if photo:
             try:
-                match = re.match(r'data:image/(\w+);base64,(.+)', photo)
-                if match:
-                    image_format = match.group(1).lower()
-                    image_data = match.group(2)
-                    
-                    image_bytes = base64.b64decode(image_data)
-                    compressed_bytes = self.compress_image(image_bytes, image_format)
-                    
-                    photo_filename = 'photo.jpg'
-                    photo_file_path = client_dir / photo_filename
-                    
-                    with open(photo_file_path, 'wb') as f:
-                        f.write(compressed_bytes)
-                    
-                    photo_path = f'./{photo_filename}'
-                    
-                    original_size = len(image_bytes) / 1024
-                    compressed_size = len(compressed_bytes) / 1024
-                    print(f"✅ Photo: {original_size:.1f}KB → {compressed_size:.1f}KB")
+                if deferred:
+                    self.stash_photo(username, photo)
+                else:
+                    photo_path = self.save_photo(client_dir, photo)
             except Exception as e:
                 print(f"⚠️ Photo failed: {e}")
                 photo_path = ''
 
         # Handle CV upload
         cv_path = ''
-        if cv and cv.startswith('data:application/pdf'):
+        if cv:
             try:
-                match = re.match(r'data:application/pdf;base64,(.+)', cv)
-                if match:
-                    cv_data = match.group(1)
-                    cv_bytes = base64.b64decode(cv_data)
-                    
-                    cv_filename = 'cv.pdf'
-                    cv_file_path = client_dir / cv_filename
-                    
-                    with open(cv_file_path, 'wb') as f:
-                        f.write(cv_bytes)
-                    
-                    cv_path = f'./{cv_filename}'
-                    
-                    cv_size = len(cv_bytes) / 1024
-                    print(f"✅ CV: {cv_size:.1f}KB")
+                cv_path = self.save_cv(client_dir, cv)
             except Exception as e:
                 print(f"⚠️ CV upload failed: {e}")
                 cv_path = ''
@@ -304,14 +597,14 @@ class CardGenerator:
         if data.get('PHONE2'):
             data['PHONE2_INTL'] = self.format_phone_international(data['PHONE2'])
 
+        if deferred:
+            data['assets'] = 'processing'
+        else:
+            # Smaller WebP/JPEG copies for srcset
+            self.build_photo_variants(client_dir, data)
+
         # Generate HTML from template
-        try:
-            html = self.load_template(template)
-            html = self.replace_variables(html, data)
-        except Exception as e:
-            print(f"⚠️ Template error: {e}")
-            html = self.load_template('professional')
-            html = self.replace_variables(html, data)
+        html = self.render_html(template, data)
 
         # Save index.html
         output_file = client_dir / 'index.html'
@@ -322,36 +615,27 @@ class CardGenerator:
         data_file = client_dir / 'data.json'
         with open(data_file, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
+        self.card_index.refresh(username)
 
         # Create vCard
         self._create_vcard(data, username, client_dir)
 
-        # ✅ Generate .pkpass for Apple Wallet
-        try:
-            build_pkpass_script = self.repo_path / 'tools' / 'build_pkpass.py'
-            if build_pkpass_script.exists():
-                result = subprocess.run(
-                    ['python3', str(build_pkpass_script), username],
-                    cwd=str(self.repo_path),
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
-                if result.returncode == 0:
-                    print(f"✅ Generated .pkpass for {username}")
-                else:
-                    print(f"⚠️ .pkpass generation failed: {result.stderr}")
-            else:
-                print(f"⚠️ build_pkpass.py not found")
-        except Exception as e:
-            print(f"⚠️ Failed to generate .pkpass: {e}")
+        if deferred:
+            job_id = self.queue_media_job(username)
+        else:
+            # ✅ Generate .pkpass for Apple Wallet
+            job_id = None
+            self.build_pkpass(username, data)
+
+        self._publish_card_event('card-created', username, data)
 
         return {
             'username': username,
             'url': f'https://maroof-id.github.io/maroof-cards-data/{username}/',
             'path': str(output_file),
             'template': template,
-            'source': source
+            'source': source,
+            'job': job_id
         }
 
     def update_card(
@@ -374,256 +658,229 @@ class CardGenerator:
         custom_link: str = None,
         bio: str = None,
         template: str = None,
-        photo: str = None,
-        cv: str = None
+        photo: Union[str, Path] = None,
+        cv: Union[str, Path] = None
     ) -> Dict[str, str]:
-        """Update existing card"""
+        """Update existing card (`photo`/`cv` as in create_card)"""
         
         data_file = self.clients_path / username / 'data.json'
         if not data_file.exists():
             raise ValueError(f'Card not found: {username}')
         
-        with open(data_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Update all fields
-        if name: data['NAME'] = name
-        if job_title is not None: data['JOB_TITLE'] = job_title
-        if company is not None: data['COMPANY'] = company
-        if phone: data['PHONE'] = phone
-        if phone2 is not None: data['PHONE2'] = phone2
-        if email: data['EMAIL'] = email
-        if instagram: data['INSTAGRAM'] = instagram.lstrip('@')
-        if linkedin: data['LINKEDIN'] = linkedin
-        if twitter: data['TWITTER'] = twitter.lstrip('@')
-        if youtube is not None: data['YOUTUBE'] = youtube
-        if tiktok is not None: data['TIKTOK'] = tiktok.lstrip('@')
-        if snapchat is not None: data['SNAPCHAT'] = snapchat
-        if github is not None: data['GITHUB'] = github
-        if website is not None: data['WEBSITE'] = website
-        if custom_link is not None: data['CUSTOM_LINK'] = custom_link
-        if bio is not None: data['BIO'] = bio
-        if template: data['template'] = template
-        
-        client_dir = self.clients_path / username
-        
-        # Update photo
-        if photo and photo.startswith('data:image'):
-            try:
-                match = re.match(r'data:image/(\w+);base64,(.+)', photo)
-                if match:
-                    image_data = match.group(2)
-                    image_bytes = base64.b64decode(image_data)
-                    compressed_bytes = self.compress_image(image_bytes, 'jpg')
-                    
-                    photo_filename = 'photo.jpg'
-                    photo_file_path = client_dir / photo_filename
-                    
-                    with open(photo_file_path, 'wb') as f:
-                        f.write(compressed_bytes)
-                    
-                    data['PHOTO'] = f'./{photo_filename}'
-            except Exception as e:
-                print(f"⚠️ Photo update failed: {e}")
-        
-        # Update CV
-        if cv and cv.startswith('data:application/pdf'):
-            try:
-                match = re.match(r'data:application/pdf;base64,(.+)', cv)
-                if match:
-                    cv_data = match.group(1)
-                    cv_bytes = base64.b64decode(cv_data)
-                    
-                    cv_filename = 'cv.pdf'
-                    cv_file_path = client_dir / cv_filename
-                    
-                    with open(cv_file_path, 'wb') as f:
-                        f.write(cv_bytes)
-                    
-                    data['CV'] = f'./{cv_filename}'
-            except Exception as e:
-                print(f"⚠️ CV update failed: {e}")
-        
-        # Update status
-        if data.get('print_count', 0) > 0:
-            data['status'] = 'modified'
-        
-        # Format phone numbers
-        if data.get('PHONE'):
-            data['PHONE_INTL'] = self.format_phone_international(data['PHONE'])
-        if data.get('PHONE2'):
-            data['PHONE2_INTL'] = self.format_phone_international(data['PHONE2'])
-        
-        # Use template from data
-        template_name = data.get('template', 'professional')
+        with self.card_lock(username):
+            with open(data_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        
+            # Update all fields
+            if name: data['NAME'] = name
+            if job_title is not None: data['JOB_TITLE'] = job_title
+            if company is not None: data['COMPANY'] = company
+            if phone: data['PHONE'] = phone
+            if phone2 is not None: data['PHONE2'] = phone2
+            if email: data['EMAIL'] = email
+            if instagram: data['INSTAGRAM'] = instagram.lstrip('@')
+            if linkedin: data['LINKEDIN'] = linkedin
+            if twitter: data['TWITTER'] = twitter.lstrip('@')
+            if youtube is not None: data['YOUTUBE'] = youtube
+            if tiktok is not None: data['TIKTOK'] = tiktok.lstrip('@')
+            if snapchat is not None: data['SNAPCHAT'] = snapchat
+            if github is not None: data['GITHUB'] = github
+            if website is not None: data['WEBSITE'] = website
+            if custom_link is not None: data['CUSTOM_LINK'] = custom_link
+            if bio is not None: data['BIO'] = bio
+            if template: data['template'] = template
+        
+            client_dir = self.clients_path / username
+            deferred = self.media_jobs is not None
+        
+            # Update photo
+            if photo:
+                try:
+                    if deferred:
+                        self.stash_photo(username, photo)
+                    else:
+                        photo_path = self.save_photo(client_dir, photo)
+                        if photo_path:
+                            data['PHOTO'] = photo_path
+                except Exception as e:
+                    print(f"⚠️ Photo update failed: {e}")
+        
+            # Update CV
+            if cv:
+                try:
+                    cv_path = self.save_cv(client_dir, cv)
+                    if cv_path:
+                        data['CV'] = cv_path
+                except Exception as e:
+                    print(f"⚠️ CV update failed: {e}")
+        
+            # Update status
+            if data.get('print_count', 0) > 0:
+                data['status'] = 'modified'
+        
+            # Format phone numbers
+            if data.get('PHONE'):
+                data['PHONE_INTL'] = self.format_phone_international(data['PHONE'])
+            if data.get('PHONE2'):
+                data['PHONE2_INTL'] = self.format_phone_international(data['PHONE2'])
+        
+            if deferred:
+                data['assets'] = 'processing'
+            else:
+                # Smaller WebP/JPEG copies for srcset (reused if the photo is unchanged)
+                self.build_photo_variants(client_dir, data)
         
-        # Generate HTML
-        try:
-            html = self.load_template(template_name)
-            html = self.replace_variables(html, data)
-        except Exception as e:
-            print(f"⚠️ Template error: {e}")
-            html = self.load_template('professional')
-            html = self.replace_variables(html, data)
+            # Use template from data
+            template_name = data.get('template', 'professional')
         
-        # Save index.html
-        output_file = self.clients_path / username / 'index.html'
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(html)
+            # Generate HTML
+            html = self.render_html(template_name, data)
         
-        # Save data.json
-        with open(data_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+            # Save index.html
+            output_file = self.clients_path / username / 'index.html'
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(html)
         
-        # Update vCard
-        self._create_vcard(data, username, self.clients_path / username)
+            # Save data.json
+            with open(data_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.card_index.refresh(username)
         
-        # ✅ Regenerate .pkpass
-        try:
-            build_pkpass_script = self.repo_path / 'tools' / 'build_pkpass.py'
-            if build_pkpass_script.exists():
-                result = subprocess.run(
-                    ['python3', str(build_pkpass_script), username],
-                    cwd=str(self.repo_path),
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
-                if result.returncode == 0:
-                    print(f"✅ Regenerated .pkpass for {username}")
-        except Exception as e:
-            print(f"⚠️ Failed to regenerate .pkpass: {e}")
+            # Update vCard
+            self._create_vcard(data, username, self.clients_path / username)
+
+            if deferred:
+                # Queued under the lock so a running job sees it and leaves the flag set
+                job_id = self.queue_media_job(username)
+            else:
+                # ✅ Regenerate .pkpass
+                job_id = None
+                self.build_pkpass(username, data)
+
+        self._publish_card_event('card-updated', username, data)
         
         return {
             'username': username,
             'url': f'https://maroof-id.github.io/maroof-cards-data/{username}/',
             'status': data.get('status'),
-            'template': template_name
+            'template': template_name,
+            'job': job_id
         }
 
+    def queue_media_job(self, username: str) -> str:
+        """Hand a card's photo/.pkpass work to the media job queue; returns the job id"""
+        return self.media_jobs.submit('media', username, self.process_card_media, username)['id']
+
+    def process_card_media(self, username: str):
+        """Photo, srcset variants and .pkpass for a card, then clear its processing flag
+
+        Runs on a media job worker. The slow photo work happens outside the
+        card lock; the result is then merged into a fresh read of data.json
+        under the lock, so only PHOTO and the srcset fields come from the job
+        and edits saved meanwhile are kept.
+        """
+        client_dir = self.clients_path / username
+        data = self.get_card_data(username)
+        if data is None:
+            # Deleted while queued
+            self._drop_stashed_photos(username)
+            return
+
+        upload = self._claim_photo(username)
+
+        if upload:
+            try:
+                photo_path = self.save_photo(client_dir, upload)
+                if photo_path:
+                    data['PHOTO'] = photo_path
+            except Exception as e:
+                print(f"⚠️ Photo failed: {e}")
+            finally:
+                upload.unlink(missing_ok=True)
+
+        self.build_photo_variants(client_dir, data)
+        assets = {key: data.get(key, '') for key in ('PHOTO', *srcset_fields(None))}
+
+        with self.card_lock(username):
+            data = self.get_card_data(username)
+            if data is None:
+                return
+
+            for key, value in assets.items():
+                if value:
+                    data[key] = value
+                else:
+                    data.pop(key, None)
+            # An edit saved meanwhile queued another job, which clears the flag
+            if self.media_jobs is None or self.media_jobs.pending(username) <= 1:
+                data.pop('assets', None)
+
+            html = self.render_html(data.get('template', 'professional'), data)
+            with open(client_dir / 'index.html', 'w', encoding='utf-8') as f:
+                f.write(html)
+            with open(client_dir / 'data.json', 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.card_index.refresh(username)
+            self._create_vcard(data, username, client_dir)
+            self.build_pkpass(username, data)
+
+        self._publish_card_event('card-updated', username, data)
+        self.git_push_background(f"Card media: {username}", [username])
+
+    def resume_media_jobs(self) -> int:
+        """Re-queue cards left processing by a restart; returns how many"""
+        # Uploads a job had claimed when the process stopped go back in the stash
+        for claimed in self.uploads_path.glob('*.claimed*'):
+            os.replace(claimed, claimed.with_name(claimed.name.replace('.claimed', '.photo', 1)))
+
+        usernames = [card['username'] for card in self.list_cards() if card.get('processing')]
+        for username in usernames:
+            self.queue_media_job(username)
+        return len(usernames)
+
     def mark_as_printed(self, username: str) -> bool:
         """Mark card as printed"""
         data_file = self.clients_path / username / 'data.json'
         if not data_file.exists():
             return False
         
-        with open(data_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        data['print_count'] = data.get('print_count', 0) + 1
-        data['status'] = 'printed'
-        
-        if 'print_history' not in data:
-            data['print_history'] = []
-        
-        data['print_history'].append({
-            'date': datetime.now().isoformat(),
-            'count': data['print_count']
-        })
-        
-        with open(data_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        with self.card_lock(username):
+            with open(data_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+            data['print_count'] = data.get('print_count', 0) + 1
+            data['status'] = 'printed'
+
+            if 'print_history' not in data:
+                data['print_history'] = []
+
+            data['print_history'].append({
+                'date': datetime.now().isoformat(),
+                'count': data['print_count']
+            })
+
+            with open(data_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.card_index.refresh(username)
+
+        self._publish_card_event('card-printed', username, data)
         
         return True
 
-    def _create_vcard(self, data: Dict[str, str], username: str, client_dir: Path):
-        """Create vCard file with all contact info"""
-        vcard_lines = [
-            'BEGIN:VCARD',
-            'VERSION:3.0',
-            f'FN:{data.get("NAME", "")}',
-            f'N:{data.get("NAME", "")};;;;',
-        ]
-        
-        # Job title & Company
-        if data.get('JOB_TITLE') or data.get('COMPANY'):
-            title = data.get('JOB_TITLE', '')
-            org = data.get('COMPANY', '')
-            if title:
-                vcard_lines.append(f'TITLE:{title}')
-            if org:
-                vcard_lines.append(f'ORG:{org}')
-        
-        # Photo
-        if data.get('PHOTO') and data['PHOTO'].startswith('./'):
-            photo_url = f'https://maroof-id.github.io/maroof-cards-data/{username}/{data["PHOTO"][2:]}'
-            vcard_lines.append(f'PHOTO;VALUE=URL;TYPE=JPEG:{photo_url}')
-        
-        # Phone numbers
-        if data.get('PHONE_INTL'):
-            vcard_lines.append(f'TEL;TYPE=CELL:+{data["PHONE_INTL"]}')
-        elif data.get('PHONE'):
-            vcard_lines.append(f'TEL;TYPE=CELL:{data["PHONE"]}')
-        
-        if data.get('PHONE2_INTL'):
-            vcard_lines.append(f'TEL;TYPE=CELL:+{data["PHONE2_INTL"]}')
-        elif data.get('PHONE2'):
-            vcard_lines.append(f'TEL;TYPE=CELL:{data["PHONE2"]}')
-        
-        # Email
-        if data.get('EMAIL'):
-            vcard_lines.append(f'EMAIL;TYPE=INTERNET:{data["EMAIL"]}')
-        
-        # Website
-        if data.get('WEBSITE'):
-            vcard_lines.append(f'URL;TYPE=Website:{data["WEBSITE"]}')
-        
-        # Social media
-        if data.get('INSTAGRAM'):
-            vcard_lines.append(f'URL;TYPE=Instagram:https://instagram.com/{data["INSTAGRAM"]}')
-        
-        if data.get('LINKEDIN'):
-            vcard_lines.append(f'URL;TYPE=LinkedIn:https://linkedin.com/in/{data["LINKEDIN"]}')
-        
-        if data.get('TWITTER'):
-            vcard_lines.append(f'URL;TYPE=Twitter:https://twitter.com/{data["TWITTER"]}')
-        
-        if data.get('YOUTUBE'):
-            youtube = data['YOUTUBE']
-            if youtube.startswith('http'):
-                vcard_lines.append(f'URL;TYPE=YouTube:{youtube}')
-            else:
-                vcard_lines.append(f'URL;TYPE=YouTube:https://youtube.com/@{youtube}')
-        
-        if data.get('TIKTOK'):
-            vcard_lines.append(f'URL;TYPE=TikTok:https://tiktok.com/@{data["TIKTOK"]}')
-        
-        if data.get('SNAPCHAT'):
-            vcard_lines.append(f'URL;TYPE=Snapchat:https://snapchat.com/add/{data["SNAPCHAT"]}')
-        
-        if data.get('GITHUB'):
-            vcard_lines.append(f'URL;TYPE=GitHub:https://github.com/{data["GITHUB"]}')
-        
-        # Custom link
-        if data.get('CUSTOM_LINK'):
-            vcard_lines.append(f'URL;TYPE=Custom:{data["CUSTOM_LINK"]}')
-        
-        # CV
-        if data.get('CV') and data['CV'].startswith('./'):
-            cv_url = f'https://maroof-id.github.io/maroof-cards-data/{username}/{data["CV"][2:]}'
-            vcard_lines.append(f'URL;TYPE=CV:{cv_url}')
-        
-        # Card URL
-        vcard_lines.append(f'URL:https://maroof-id.github.io/maroof-cards-data/{username}/')
-        
-        # Bio
-        if data.get('BIO'):
-            vcard_lines.append(f'NOTE:{data["BIO"]}')
-        
-        vcard_lines.append('END:VCARD')
-        
-        vcard_path = client_dir / 'contact.vcf'
-        with open(vcard_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(vcard_lines))
-        
-        return vcard_path
+    def _publish_card_event(self, event: str, username: str, data: Optional[Dict] = None):
+        """Push a card change with fresh stats to /api/events subscribers"""
+        payload = {'username': username, 'stats': self.card_stats()}
+        if data is not None:
+            payload['card'] = card_summary(username, data)
+        self.events.publish(event, payload)
 
-    def git_push(self, message: str = 'Update cards', timeout: int = 30) -> Tuple[bool, str]:
-        """Push to GitHub"""
+    def git_push(self, message: str = 'Update cards', paths: Optional[List[str]] = None, timeout: int = 30) -> Tuple[bool, str]:
+        """Push to GitHub (only `paths` when given, else the whole repo)"""
         try:
-            subprocess.run(['git', 'add', '.'], cwd=self.repo_path, check=True, timeout=timeout, capture_output=True)
+            pathspec = ['--', *paths] if paths else ['.']
+            subprocess.run(['git', 'add', '-A', *pathspec], cwd=self.repo_path, check=True, timeout=timeout, capture_output=True)
             
-            status = subprocess.run(['git', 'status', '--porcelain'], cwd=self.repo_path, capture_output=True, text=True, check=True, timeout=timeout)
+            status = subprocess.run(['git', 'diff', '--cached', '--name-only'], cwd=self.repo_path, capture_output=True, text=True, check=True, timeout=timeout)
             
             if not status.stdout.strip():
                 return True, "No changes"
@@ -635,156 +892,60 @@ class CardGenerator:
         except:
             return False, "Failed"
 
-    def git_push_background(self, message: str):
-        """Push clients to maroof-cards-data repo with auto-pull"""
-        import logging
-        
-        def git_push():
-            try:
-                clients_path = str(self.clients_path)
-                
-                # Configure logging
-                log_file = self.repo_path / 'git_push.log'
-                logging.basicConfig(
-                    filename=str(log_file),
-                    level=logging.INFO,
-                    format='%(asctime)s - %(message)s'
-                )
-                
-                logging.info(f"Starting push: {message}")
-                
-                # ✅ FIX: Pull first to avoid conflicts
-                result_pull = subprocess.run(
-                    ['git', 'pull', 'origin', 'main', '--rebase'],
-                    cwd=clients_path,
-                    capture_output=True,
-                    text=True,
-                    timeout=60
-                )
-                
-                if result_pull.returncode != 0:
-                    # If pull fails, log it but continue (might be first push)
-                    logging.warning(f"Pull failed (might be first push): {result_pull.stderr}")
-                else:
-                    logging.info("Pulled latest changes")
-                
-                # 1. Add all files
-                result_add = subprocess.run(
-                    ['git', 'add', '.'],
-                    cwd=clients_path,
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
-                
-                if result_add.returncode != 0:
-                    logging.error(f"git add failed: {result_add.stderr}")
-                    print(f"❌ git add failed: {result_add.stderr}")
-                    return
-                
-                # 2. Check for changes
-                result_status = subprocess.run(
-                    ['git', 'status', '--porcelain'],
-                    cwd=clients_path,
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
-                
-                if not result_status.stdout.strip():
-                    logging.info("No changes to commit")
-                    return
-                
-                logging.info(f"Changes detected:\n{result_status.stdout}")
-                
-                # 3. Commit
-                result_commit = subprocess.run(
-                    ['git', 'commit', '-m', message],
-                    cwd=clients_path,
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
-                
-                if result_commit.returncode != 0:
-                    if "nothing to commit" in result_commit.stdout:
-                        logging.info("Nothing to commit")
-                        return
-                    else:
-                        logging.error(f"git commit failed: {result_commit.stderr}")
-                        print(f"❌ git commit failed: {result_commit.stderr}")
-                        return
-                
-                logging.info("Commit successful")
-                
-                # 4. Push
-                result_push = subprocess.run(
-                    ['git', 'push', 'origin', 'main'],
-                    cwd=clients_path,
-                    capture_output=True,
-                    text=True,
-                    timeout=120
-                )
-                
-                if result_push.returncode == 0:
-                    logging.info(f"✅ Push successful: {message}")
-                    print(f"✅ Client data pushed: {message}")
-                else:
-                    logging.error(f"Push failed!\nSTDOUT: {result_push.stdout}\nSTDERR: {result_push.stderr}")
-                    print(f"❌ Push failed: {result_push.stderr}")
-                    
-            except subprocess.TimeoutExpired as e:
-                logging.error(f"Timeout: {e}")
-                print(f"❌ Timeout: {e}")
-            except Exception as e:
-                logging.error(f"Exception: {e}")
-                print(f"❌ Exception: {e}")
-                import traceback
-                logging.error(traceback.format_exc())
-        
-        thread = threading.Thread(target=git_push, daemon=True)
-        thread.start()
-            
-    def get_card_data(self, username: str) -> Optional[Dict]:
-        """Load card data"""
-        data_file = self.clients_path / username / 'data.json'
-        if not data_file.exists():
-            return None
-        with open(data_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+    def git_push_background(self, message: str, usernames: Optional[List[str]] = None):
+        """Queue a push of clients to maroof-cards-data (batched by the sync worker)
+
+        Only the given cards' directories are staged; None stages everything.
+        """
+        self.git_sync.enqueue(message, usernames)
+
+    def git_sync_status(self) -> Dict:
+        """Queue depth and last result of the sync worker"""
+        return self.git_sync.status()
+
+    def unpublished_cards(self) -> Dict:
+        """Cards with changes still waiting in the git outbox"""
+        pending = self.git_sync.unpublished()
+        cards = []
+        for username, queued_at in sorted(pending['paths'].items(), key=lambda x: x[1]):
+            data = self.get_card_data(username)
+            cards.append({
+                'username': username,
+                'name': data.get('NAME', '') if data else '',
+                'deleted': data is None,
+                'queued_at': queued_at
+            })
+        return {'cards': cards, 'full_sync': pending['full_sync'], 'intents': pending['intents']}
+
+    def _publish_sync_result(self, result: Dict):
+        self.events.publish('git-sync', result)
 
     def list_cards(self, status_filter: str = None) -> list:
         """List all cards"""
-        cards = []
-        for client_dir in self.clients_path.iterdir():
-            if client_dir.is_dir():
-                data_file = client_dir / 'data.json'
-                if data_file.exists():
-                    with open(data_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        card_status = data.get('status', 'pending')
-                        
-                        if status_filter is None or card_status == status_filter:
-                            cards.append({
-                                'username': client_dir.name,
-                                'name': data.get('NAME', ''),
-                                'phone': data.get('PHONE', ''),
-                                'status': card_status,
-                                'source': data.get('source', 'admin'),
-                                'template': data.get('template', 'professional'),
-                                'print_count': data.get('print_count', 0),
-                                'created_at': data.get('created_at', ''),
-                                'url': f'https://maroof-id.github.io/maroof-cards-data/{client_dir.name}/'
-                            })
-        
-        cards.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-        return cards
+        return self.card_index.cards(status_filter)
+
+    def query_cards(self, **filters) -> Tuple[list, int]:
+        """Filtered, sorted, paginated cards plus total matches (see CardIndex.query)"""
+        return self.card_index.query(**filters)
+
+    def card_stats(self) -> Dict[str, int]:
+        """Card counts per status"""
+        return self.card_index.stats()
+
+    def cards_version(self) -> int:
+        """Version of the card collection, for HTTP validators"""
+        return self.card_index.version()
+
+    def rebuild_card_index(self) -> int:
+        """Reload the card index and counters from clients/"""
+        return self.card_index.rebuild()
 
     def delete_card(self, username: str) -> bool:
         """Delete card"""
-        import shutil
         client_dir = self.clients_path / username
         if not client_dir.exists():
             return False
         shutil.rmtree(client_dir)
+        self.card_index.remove(username)
+        self._publish_card_event('card-deleted', username)
         return True
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Maroof - Event Bus
+Fans card change events out to server-sent event subscribers
+"""
+
+import json
+import uuid
+import queue
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+Event = Tuple[int, str, Dict]
+
+
+class EventBus:
+    """In-process publish/subscribe with a short replay history
+
+    Event ids are "<run id>-<n>": n restarts at 1 with the process, so a
+    Last-Event-ID from another run must not be matched against this run's
+    history.
+    """
+
+    def __init__(self, history: int = 200, run_id: Optional[str] = None):
+        self.run_id = run_id or uuid.uuid4().hex[:8]
+        self._subscribers: List[queue.Queue] = []
+        self._history: deque = deque(maxlen=history)
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def publish(self, event: str, data: Dict):
+        with self._lock:
+            item = (self._next_id, event, data)
+            self._next_id += 1
+            self._history.append(item)
+            for subscriber in self._subscribers:
+                subscriber.put(item)
+
+    def event_id(self, number: int) -> str:
+        """Wire id of an event (as sent in the SSE id: field)"""
+        return f'{self.run_id}-{number}'
+
+    def _parse_id(self, event_id: str) -> Optional[int]:
+        """This run's event number from a wire id, None if from another run"""
+        run_id, _, number = event_id.rpartition('-')
+        if run_id != self.run_id or not number.isdigit():
+            return None
+        return int(number)
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> queue.Queue:
+        """Queue of new events, primed with anything missed since last_event_id"""
+        subscriber = queue.Queue()
+        with self._lock:
+            if last_event_id is not None:
+                number = self._parse_id(last_event_id)
+                oldest = self._history[0][0] if self._history else self._next_id
+                if number is None or number >= self._next_id or number < oldest - 1:
+                    # Server restarted or history rolled over: client must reload
+                    subscriber.put((self._next_id - 1, 'resync', {}))
+                else:
+                    for item in self._history:
+                        if item[0] > number:
+                            subscriber.put(item)
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+def format_sse(event_id: str, event: str, data: Dict) -> str:
+    """Serialize one event in text/event-stream format"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
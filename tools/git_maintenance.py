@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Maroof - Git Maintenance
+Keeps the clients data repo packed and indexed as photos and CVs pile up
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Full gc once loose objects or packs pile up past these (git's own gc.auto defaults are similar)
+LOOSE_OBJECTS_GC = 1000
+PACKS_GC = 20
+
+# Warn when the data repo gets large enough to make clone/pull/push slow on the Pi
+WARN_SIZE_MB = 500
+WARN_OBJECTS = 200000
+
+
+def repo_stats(repo_dir: Path) -> Dict[str, int]:
+    """Object counts and sizes (bytes) from `git count-objects -v`"""
+    # clients/ may be an uninitialized submodule: never fall through to the parent repo
+    if not (Path(repo_dir) / '.git').exists():
+        raise RuntimeError(f'{repo_dir} is not a git repository')
+
+    result = subprocess.run(
+        ['git', 'count-objects', '-v'],
+        cwd=str(repo_dir), capture_output=True, text=True, timeout=60
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or 'git count-objects failed')
+
+    raw = {}
+    for line in result.stdout.splitlines():
+        key, _, value = line.partition(':')
+        try:
+            raw[key.strip()] = int(value.strip())
+        except ValueError:
+            continue
+
+    loose_bytes = raw.get('size', 0) * 1024
+    pack_bytes = raw.get('size-pack', 0) * 1024
+    return {
+        'loose_objects': raw.get('count', 0),
+        'loose_bytes': loose_bytes,
+        'packed_objects': raw.get('in-pack', 0),
+        'packs': raw.get('packs', 0),
+        'pack_bytes': pack_bytes,
+        'garbage_bytes': raw.get('size-garbage', 0) * 1024,
+        'total_objects': raw.get('count', 0) + raw.get('in-pack', 0),
+        'total_bytes': loose_bytes + pack_bytes
+    }
+
+
+class GitMaintenance:
+    """gc / repack / commit-graph / multi-pack-index for the clients repo
+
+    Meant to run on the git sync worker thread (see GitSyncWorker), so it
+    never overlaps a pull or push. The last report is kept in `state_file`
+    so the schedule survives restarts.
+    """
+
+    def __init__(
+        self,
+        repo_dir: Path,
+        state_file: Path,
+        interval: float = 24 * 3600,
+        warn_size_mb: float = WARN_SIZE_MB,
+        warn_objects: int = WARN_OBJECTS
+    ):
+        self.repo_dir = Path(repo_dir)
+        self.state_file = Path(state_file)
+        self.interval = interval
+        self.warn_size_mb = warn_size_mb
+        self.warn_objects = warn_objects
+        self.last_report = self._load()
+
+    def _load(self) -> Optional[Dict]:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save(self, report: Dict):
+        tmp_path = self.state_file.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_file)
+
+    def due(self) -> bool:
+        """Whether the scheduled interval has passed since the last run"""
+        if not (self.repo_dir / '.git').exists():
+            return False
+        if not self.last_report:
+            return True
+        return time.time() - self.last_report.get('finished_ts', 0) >= self.interval
+
+    def check_thresholds(self, stats: Dict[str, int]) -> List[str]:
+        warnings = []
+        size_mb = stats['total_bytes'] / (1024 * 1024)
+        if size_mb >= self.warn_size_mb:
+            warnings.append(f"Data repo is {size_mb:.0f} MB (warning at {self.warn_size_mb:.0f} MB)")
+        if stats['total_objects'] >= self.warn_objects:
+            warnings.append(f"Data repo has {stats['total_objects']} objects (warning at {self.warn_objects})")
+        return warnings
+
+    def _git(self, *args, timeout: int = 600) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            ['git', *args],
+            cwd=str(self.repo_dir),
+            capture_output=True,
+            text=True,
+            timeout=timeout
+        )
+
+    def run(self, full: bool = False) -> Dict:
+        """Pack and index the repo; full gc only when objects piled up (or `full`)"""
+        started = time.time()
+        before = repo_stats(self.repo_dir)
+
+        steps = []
+        if full or before['loose_objects'] >= LOOSE_OBJECTS_GC or before['packs'] >= PACKS_GC:
+            steps.append(('gc', ['gc', '--quiet', '--prune=2.weeks.ago']))
+        elif before['loose_objects']:
+            # Pack new loose objects without rewriting existing packs
+            steps.append(('repack', ['repack', '-d', '-q']))
+        steps.append(('commit-graph', ['commit-graph', 'write', '--reachable', '--split']))
+        steps.append(('multi-pack-index', ['multi-pack-index', 'write']))
+
+        results = []
+        for name, args in steps:
+            step_started = time.time()
+            try:
+                result = self._git(*args)
+                ok, error = result.returncode == 0, result.stderr.strip()
+            except subprocess.TimeoutExpired:
+                ok, error = False, 'Timeout'
+            results.append({
+                'step': name,
+                'success': ok,
+                'duration': round(time.time() - step_started, 3),
+                **({} if ok else {'error': error})
+            })
+
+        after = repo_stats(self.repo_dir)
+        warnings = self.check_thresholds(after)
+        for warning in warnings:
+            print(f"⚠️ {warning}")
+
+        report = {
+            'success': all(r['success'] for r in results),
+            'before': before,
+            'after': after,
+            'steps': results,
+            'warnings': warnings,
+            'duration': round(time.time() - started, 3),
+            'finished_at': datetime.now().isoformat(),
+            'finished_ts': time.time()
+        }
+        self.last_report = report
+        self._save(report)
+        return report
+
+
+def format_bytes(size: int) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run git maintenance on the clients data repo")
+    parser.add_argument('--full', action='store_true', help="Always run a full gc")
+    parser.add_argument('--stats', action='store_true', help="Only print object counts and sizes")
+    parser.add_argument('--warn-size-mb', type=float, default=WARN_SIZE_MB, help="Warn above this repo size")
+    parser.add_argument('--warn-objects', type=int, default=WARN_OBJECTS, help="Warn above this many objects")
+    args = parser.parse_args()
+
+    repo_path = Path(__file__).resolve().parent.parent
+    maintenance = GitMaintenance(
+        repo_path / 'clients',
+        repo_path / '.git_maintenance.json',
+        warn_size_mb=args.warn_size_mb,
+        warn_objects=args.warn_objects
+    )
+
+    if args.stats:
+        stats = repo_stats(maintenance.repo_dir)
+        print(f"📊 {stats['total_objects']} objects ({stats['loose_objects']} loose, "
+              f"{stats['packs']} packs), {format_bytes(stats['total_bytes'])}")
+        for warning in maintenance.check_thresholds(stats):
+            print(f"⚠️ {warning}")
+        sys.exit(0)
+
+    # Run this while the web app is stopped, or use POST /api/git/maintenance
+    report = maintenance.run(full=args.full)
+    before, after = report['before'], report['after']
+    for step in report['steps']:
+        print(f"{'✅' if step['success'] else '❌'} {step['step']} ({step['duration']:.1f}s)"
+              + ('' if step['success'] else f": {step['error']}"))
+    print(f"📊 objects {before['total_objects']} → {after['total_objects']}, "
+          f"loose {before['loose_objects']} → {after['loose_objects']}, "
+          f"packs {before['packs']} → {after['packs']}, "
+          f"size {format_bytes(before['total_bytes'])} → {format_bytes(after['total_bytes'])}")
+    sys.exit(0 if report['success'] else 1)
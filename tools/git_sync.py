@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Maroof - Git Sync Worker
+One background worker that batches card changes into serialized commits and pushes
+"""
+
+import os
+import json
+import time
+import fcntl
+import uuid
+import random
+import logging
+import threading
+import traceback
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+def combine_messages(messages: List[str]) -> str:
+    """One commit message for a batch of changes"""
+    if len(messages) == 1:
+        return messages[0]
+    lines = [f"{len(messages)} card changes", ""]
+    lines.extend(f"- {message}" for message in messages)
+    return '\n'.join(lines)
+
+
+class GitSyncWorker:
+    """Serializes git pull/add/commit/push for the clients repo
+
+    Changes are queued and a single thread syncs them. A burst is collected
+    until `debounce` seconds pass with no new change (or `max_delay` since
+    the first one) and goes out as one commit.
+
+    Changes name the paths they touched and only those are staged, so a sync
+    costs the same however many cards the repo holds. A change without paths,
+    the first sync after startup and one sync every `reconcile_interval`
+    seconds stage the whole tree to pick up anything written outside the app.
+
+    Queued changes are kept in an on-disk outbox until they are pushed. A
+    failed sync is retried with exponential backoff and jitter, and the
+    outbox is replayed by start() after a restart.
+
+    An optional `maintenance` job (see git_maintenance.GitMaintenance) runs on
+    the same thread once the queue has been idle for `maintenance_idle`
+    seconds and the job says it is due, or when requested, so it never
+    overlaps a pull or push.
+
+    With a `lock_file`, every sync and maintenance run holds an flock on it,
+    so other processes working on the clients repo (bulk_import) wait for
+    the worker instead of racing it for index.lock.
+    """
+
+    def __init__(
+        self,
+        repo_dir: Path,
+        log_file: Path,
+        outbox_file: Optional[Path] = None,
+        debounce: float = 2.0,
+        max_delay: float = 15.0,
+        reconcile_interval: float = 3600.0,
+        retry_base: float = 5.0,
+        retry_max: float = 300.0,
+        on_result: Optional[Callable[[Dict], None]] = None,
+        maintenance=None,
+        maintenance_idle: float = 300.0,
+        lock_file: Optional[Path] = None
+    ):
+        self.repo_dir = Path(repo_dir)
+        self.outbox_file = Path(outbox_file) if outbox_file else None
+        self.lock_file = Path(lock_file) if lock_file else None
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.reconcile_interval = reconcile_interval
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.on_result = on_result
+        self.maintenance = maintenance
+        self.maintenance_idle = maintenance_idle
+
+        # Sync intents not yet pushed; the running batch stays here until it succeeds
+        self._outbox: List[Dict] = []
+        self._in_flight: Set[str] = set()
+        self._failures = 0
+        self._retry_at = 0.0
+        self._last_reconcile: Optional[float] = None
+        self._last_reconcile_at: Optional[str] = None
+        self._first_queued = 0.0
+        # Startup counts as activity: maintenance waits a full idle period first
+        self._last_queued = time.monotonic()
+        self._running = False
+        self._maintenance_requested = None
+        self._maintenance_running = False
+        self._last_result: Optional[Dict] = None
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+        self.logger = logging.getLogger(f'maroof.git_sync.{self.repo_dir}')
+        if not self.logger.handlers:
+            handler = logging.FileHandler(str(log_file), delay=True)
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+
+        self._load_outbox()
+
+    def _load_outbox(self):
+        if not self.outbox_file:
+            return
+        try:
+            with open(self.outbox_file, 'r', encoding='utf-8') as f:
+                self._outbox = json.load(f).get('intents', [])
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            print(f"⚠️ Ignoring unreadable git outbox ({e})")
+            return
+        now = time.monotonic()
+        self._first_queued = self._last_queued = now
+
+    def _save_outbox(self):
+        """Persist the outbox (caller holds the lock)"""
+        if not self.outbox_file:
+            return
+        tmp_path = self.outbox_file.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'intents': self._outbox}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.outbox_file)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='git-sync', daemon=True)
+            self._thread.start()
+
+    def start(self) -> int:
+        """Replay intents left over from a previous run; returns how many"""
+        with self._cond:
+            if self._outbox or self.maintenance:
+                self._ensure_thread()
+                self._cond.notify_all()
+            return len(self._outbox)
+
+    def enqueue(self, message: str, paths: Optional[Iterable[str]] = None):
+        """Queue a change for the next sync
+
+        `paths` are relative to the repo; None stages the whole tree.
+        """
+        intent = {
+            'id': uuid.uuid4().hex,
+            'message': message,
+            'paths': None if paths is None else sorted(set(paths)),
+            'queued_at': datetime.now().isoformat(),
+            'attempts': 0
+        }
+        with self._cond:
+            now = time.monotonic()
+            if not self._queued():
+                self._first_queued = now
+            self._last_queued = now
+            self._outbox.append(intent)
+            self._save_outbox()
+
+            self._ensure_thread()
+            self._cond.notify_all()
+
+    def retry_now(self):
+        """Skip the current backoff and sync pending intents right away"""
+        with self._cond:
+            self._retry_at = 0.0
+            if self._outbox:
+                self._ensure_thread()
+            self._cond.notify_all()
+
+    def request_maintenance(self, full: bool = False):
+        """Run the maintenance job as soon as no sync is pending"""
+        if not self.maintenance:
+            return
+        with self._cond:
+            self._maintenance_requested = full or bool(self._maintenance_requested)
+            self._ensure_thread()
+            self._cond.notify_all()
+
+    def _queued(self) -> List[Dict]:
+        return [i for i in self._outbox if i['id'] not in self._in_flight]
+
+    def status(self) -> Dict:
+        with self._cond:
+            queued = self._queued()
+            paths = set()
+            for intent in queued:
+                paths.update(intent['paths'] or [])
+            retry_in = self._retry_at - time.monotonic()
+            return {
+                'queue_depth': len(queued),
+                'pending_paths': len(paths),
+                'unpublished': len(self._outbox),
+                'running': self._running,
+                'maintenance_running': self._maintenance_running,
+                'failures': self._failures,
+                'next_retry_in': round(retry_in, 1) if self._failures and retry_in > 0 else 0,
+                'last_reconcile': self._last_reconcile_at,
+                'last_result': self._last_result
+            }
+
+    def unpublished(self) -> Dict:
+        """Paths with changes not pushed yet, and whether a full-tree sync is pending"""
+        with self._cond:
+            first_queued = {}
+            full_sync = False
+            for intent in self._outbox:
+                if intent['paths'] is None:
+                    full_sync = True
+                    continue
+                for path in intent['paths']:
+                    first_queued.setdefault(path, intent['queued_at'])
+            return {
+                'paths': first_queued,
+                'full_sync': full_sync,
+                'intents': len(self._outbox)
+            }
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """Block until the outbox is empty and no sync is running"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._outbox or self._running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def _backoff(self) -> float:
+        """Exponential backoff with jitter for the current failure streak"""
+        delay = min(self.retry_max, self.retry_base * 2 ** (self._failures - 1))
+        return random.uniform(delay / 2, delay)
+
+    def _maintenance_due(self, now: float) -> bool:
+        if not self.maintenance:
+            return False
+        if self._maintenance_requested is not None:
+            return True
+        return now - self._last_queued >= self.maintenance_idle and self.maintenance.due()
+
+    def _idle_wait(self, now: float) -> Optional[float]:
+        """How long an empty queue sleeps before checking maintenance again"""
+        if not self.maintenance:
+            return None
+        until_idle = self._last_queued + self.maintenance_idle - now
+        return min(60.0, until_idle) if until_idle > 0 else 60.0
+
+    def _take_batch(self) -> Tuple[Optional[List[Dict]], Optional[List[str]]]:
+        """Wait for the burst to settle (and any backoff to pass), then take the outbox
+
+        Returns (None, None) when the maintenance job should run instead.
+        """
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if not self._outbox:
+                    if self._maintenance_due(now):
+                        self._running = self._maintenance_running = True
+                        return None, None
+                    self._cond.wait(self._idle_wait(now))
+                    continue
+                settle_at = min(self._last_queued + self.debounce, self._first_queued + self.max_delay)
+                ready_at = max(settle_at, self._retry_at)
+                if now >= ready_at:
+                    break
+                self._cond.wait(ready_at - now)
+
+            reconcile_due = (
+                self._last_reconcile is None
+                or time.monotonic() - self._last_reconcile >= self.reconcile_interval
+            )
+            batch = list(self._outbox)
+            if reconcile_due or any(i['paths'] is None for i in batch):
+                paths = None
+            else:
+                paths = sorted({p for i in batch for p in i['paths']})
+
+            self._in_flight = {i['id'] for i in batch}
+            self._running = True
+            return batch, paths
+
+    def _run_maintenance(self):
+        with self._cond:
+            full = bool(self._maintenance_requested)
+            self._maintenance_requested = None
+        try:
+            with self.git_lock():
+                report = self.maintenance.run(full=full)
+            self.logger.info(
+                f"Maintenance: {report['before']['total_objects']} -> {report['after']['total_objects']} objects, "
+                f"{report['before']['packs']} -> {report['after']['packs']} packs"
+            )
+        except Exception as e:
+            self.logger.error(f"Maintenance failed: {e}")
+            print(f"⚠️ Git maintenance failed: {e}")
+        finally:
+            with self._cond:
+                self._running = self._maintenance_running = False
+                self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            batch, paths = self._take_batch()
+            if batch is None:
+                self._run_maintenance()
+                continue
+            started = time.monotonic()
+            message = combine_messages([i['message'] for i in batch])
+
+            try:
+                with self.git_lock():
+                    success, detail = self.sync(message, paths)
+            except Exception as e:
+                self.logger.error(f"Exception: {e}")
+                self.logger.error(traceback.format_exc())
+                print(f"❌ Exception: {e}")
+                success, detail = False, str(e)
+
+            result = {
+                'success': success,
+                'detail': detail,
+                'message': message,
+                'changes': len(batch),
+                'scope': 'full' if paths is None else len(paths),
+                'duration': round(time.monotonic() - started, 3),
+                'finished_at': datetime.now().isoformat()
+            }
+            with self._cond:
+                if success:
+                    self._outbox = [i for i in self._outbox if i['id'] not in self._in_flight]
+                    self._failures = 0
+                    self._retry_at = 0.0
+                    if paths is None:
+                        self._last_reconcile = started
+                        self._last_reconcile_at = result['finished_at']
+                else:
+                    # Keep the intents on disk and try again later
+                    for intent in self._outbox:
+                        if intent['id'] in self._in_flight:
+                            intent['attempts'] += 1
+                    self._failures += 1
+                    delay = self._backoff()
+                    self._retry_at = time.monotonic() + delay
+                    result['retry_in'] = round(delay, 1)
+                    self.logger.warning(f"Sync failed ({detail}), retry {self._failures} in {delay:.0f}s")
+                self._save_outbox()
+                self._in_flight = set()
+                self._last_result = result
+                self._running = False
+                self._cond.notify_all()
+
+            if self.on_result:
+                self.on_result(result)
+
+    @contextmanager
+    def git_lock(self) -> Iterator[None]:
+        """Exclusive use of the clients repo across processes (no-op without a lock_file)"""
+        if not self.lock_file:
+            yield
+            return
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _git(self, *args, timeout: int = 30) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            ['git', *args],
+            cwd=str(self.repo_dir),
+            capture_output=True,
+            text=True,
+            timeout=timeout
+        )
+
+    def stage(self, paths: Optional[List[str]] = None) -> subprocess.CompletedProcess:
+        """Stage the given paths (additions and deletions), or the whole tree"""
+        if paths is None:
+            return self._git('add', '-A', '.')
+
+        existing = [p for p in paths if (self.repo_dir / p).exists()]
+        missing = [p for p in paths if p not in existing]
+
+        result = None
+        if existing:
+            result = self._git('add', '-A', '--', *existing)
+            if result.returncode != 0:
+                return result
+        if missing:
+            # Removed (or created and removed before this sync)
+            result = self._git('rm', '-r', '-q', '--cached', '--ignore-unmatch', '--', *missing)
+        return result or subprocess.CompletedProcess(['git', 'add'], 0, '', '')
+
+    def _has_unpushed(self) -> bool:
+        """Whether HEAD has commits origin/main does not"""
+        ahead = self._git('rev-list', '--count', 'origin/main..HEAD')
+        if ahead.returncode == 0:
+            return int(ahead.stdout.strip() or 0) > 0
+        # No remote-tracking branch yet: anything committed is unpushed
+        return self._git('rev-parse', '--verify', '-q', 'HEAD').returncode == 0
+
+    def sync(self, message: str, paths: Optional[List[str]] = None) -> Tuple[bool, str]:
+        """Pull, commit the touched paths and push (on the worker thread, or elsewhere under git_lock())"""
+        try:
+            scope = 'full tree' if paths is None else f"{len(paths)} paths"
+            self.logger.info(f"Starting push ({scope}): {message}")
+
+            # Pull first to avoid conflicts; autostash keeps unrelated edits out of the way
+            result_pull = self._git('pull', 'origin', 'main', '--rebase', '--autostash', timeout=60)
+            if result_pull.returncode != 0:
+                # If pull fails, log it but continue (might be first push)
+                self.logger.warning(f"Pull failed (might be first push): {result_pull.stderr}")
+            else:
+                self.logger.info("Pulled latest changes")
+
+            # 1. Stage the touched paths (or everything when reconciling)
+            result_add = self.stage(paths)
+            if result_add.returncode != 0:
+                self.logger.error(f"git add failed: {result_add.stderr}")
+                print(f"❌ git add failed: {result_add.stderr}")
+                return False, 'git add failed'
+
+            # 2. Check for staged changes (index vs HEAD, no working tree scan)
+            result_status = self._git('diff', '--cached', '--name-status')
+            if result_status.stdout.strip():
+                self.logger.info(f"Changes detected:\n{result_status.stdout}")
+
+                # 3. Commit
+                result_commit = self._git('commit', '-m', message)
+                if result_commit.returncode != 0 and "nothing to commit" not in result_commit.stdout:
+                    self.logger.error(f"git commit failed: {result_commit.stderr}")
+                    print(f"❌ git commit failed: {result_commit.stderr}")
+                    return False, 'git commit failed'
+
+                self.logger.info("Commit successful")
+
+            # A commit from an earlier failed push still needs to go out
+            if not self._has_unpushed():
+                self.logger.info("No changes to commit")
+                return True, 'No changes'
+
+            # 4. Push
+            result_push = self._git('push', 'origin', 'main', timeout=120)
+            if result_push.returncode == 0:
+                self.logger.info(f"✅ Push successful: {message}")
+                print(f"✅ Client data pushed: {message}")
+                return True, 'Pushed'
+
+            self.logger.error(f"Push failed!\nSTDOUT: {result_push.stdout}\nSTDERR: {result_push.stderr}")
+            print(f"❌ Push failed: {result_push.stderr}")
+            return False, 'Push failed'
+
+        except subprocess.TimeoutExpired as e:
+            self.logger.error(f"Timeout: {e}")
+            print(f"❌ Timeout: {e}")
+            return False, 'Timeout'
+
+
+def fast_import_commit(repo_dir: Path, paths: List[str], message: str, timeout: int = 120) -> str:
+    """Commit the files under `paths` in one `git fast-import` run
+
+    Blobs are streamed straight into the object store and the branch is moved
+    forward without touching the index or scanning the working tree; the index
+    entries for `paths` are then reset to the new commit. Returns the commit id.
+    """
+    repo_dir = Path(repo_dir)
+
+    def git(*args, **kwargs):
+        return subprocess.run(['git', *args], cwd=str(repo_dir), capture_output=True, timeout=timeout, **kwargs)
+
+    # Never commit into an enclosing repo when clients/ is not a checkout itself
+    toplevel = git('rev-parse', '--show-toplevel', text=True)
+    if toplevel.returncode != 0 or Path(toplevel.stdout.strip()).resolve() != repo_dir.resolve():
+        raise RuntimeError(f'{repo_dir} is not a git repository')
+
+    ref = git('symbolic-ref', '-q', 'HEAD', text=True)
+    if ref.returncode != 0:
+        raise RuntimeError('clients repo is not on a branch')
+    ref = ref.stdout.strip()
+    parent = git('rev-parse', '-q', '--verify', 'HEAD', text=True).stdout.strip()
+    ident = git('var', 'GIT_COMMITTER_IDENT', text=True)
+    if ident.returncode != 0:
+        raise RuntimeError(ident.stderr.strip() or 'no git committer identity')
+
+    def blobs():
+        for path in paths:
+            # Replace the whole directory so files removed on disk go too
+            yield f"D {path}\n".encode('utf-8')
+            for dirpath, dirnames, filenames in os.walk(repo_dir / path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    file_path = Path(dirpath) / filename
+                    content = file_path.read_bytes()
+                    yield f"M 100644 inline {file_path.relative_to(repo_dir).as_posix()}\n".encode('utf-8')
+                    yield f"data {len(content)}\n".encode() + content + b"\n"
+
+    encoded = message.encode('utf-8')
+    header = (
+        f"commit {ref}\n"
+        f"committer {ident.stdout.strip()}\n"
+        f"data {len(encoded)}\n"
+    ).encode('utf-8') + encoded + b"\n"
+    if parent:
+        header += f"from {parent}\n".encode()
+
+    # Stream file contents so large batches are never held in memory at once;
+    # the branch update is refused (non fast-forward) if someone committed meanwhile
+    process = subprocess.Popen(
+        ['git', 'fast-import', '--quiet', '--done'],
+        cwd=str(repo_dir),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE
+    )
+    try:
+        process.stdin.write(header)
+        for chunk in blobs():
+            process.stdin.write(chunk)
+        process.stdin.write(b"done\n")
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+    stderr = process.stderr.read()
+    process.wait(timeout=timeout)
+    if process.returncode != 0:
+        raise RuntimeError(f"git fast-import failed: {stderr.decode('utf-8', 'replace').strip()}")
+
+    git('reset', '-q', '--', *paths)
+    return git('rev-parse', 'HEAD', text=True).stdout.strip()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Maroof - Background Job Queue
+Runs slow card work (photos, .pkpass) off the request thread with pollable status
+"""
+
+import uuid
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+
+class JobQueue:
+    """Bounded worker pool; jobs for the same card run one at a time"""
+
+    def __init__(self, workers: int = 2, history: int = 500):
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='card-job')
+        self._jobs: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._card_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, username: str, fn: Callable, *args) -> Dict:
+        """Queue fn(*args) for a card; returns the job record"""
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'username': username,
+            'status': 'queued',
+            'error': None,
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None
+        }
+        with self._lock:
+            self._jobs[job['id']] = job
+            self._trim()
+            snapshot = dict(job)
+
+        self._executor.submit(self._run, job, fn, args)
+        return snapshot
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond `history` (caller holds the lock)"""
+        excess = len(self._jobs) - self.history
+        for job_id in [j for j, job in self._jobs.items() if job['status'] in ('done', 'failed')][:max(excess, 0)]:
+            del self._jobs[job_id]
+
+    def _card_lock(self, username: str) -> threading.Lock:
+        with self._lock:
+            return self._card_locks.setdefault(username, threading.Lock())
+
+    def _run(self, job: Dict, fn: Callable, args: tuple):
+        with self._card_lock(job['username']):
+            with self._lock:
+                job['status'] = 'running'
+                job['started_at'] = datetime.now().isoformat()
+            try:
+                fn(*args)
+                status, error = 'done', None
+            except Exception as e:
+                print(f"⚠️ Job {job['kind']} failed for {job['username']}: {e}")
+                traceback.print_exc()
+                status, error = 'failed', str(e)
+
+            with self._lock:
+                job['status'] = status
+                job['error'] = error
+                job['finished_at'] = datetime.now().isoformat()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def pending(self, username: Optional[str] = None) -> int:
+        """Jobs queued or running (for one card when username is given)"""
+        with self._lock:
+            return sum(
+                1 for job in self._jobs.values()
+                if job['status'] in ('queued', 'running') and username in (None, job['username'])
+            )
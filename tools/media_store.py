@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Maroof - Media Store
+Content-addressed cache of processed uploads, so identical photos/CVs are handled once
+"""
+
+import os
+import json
+import uuid
+import shutil
+import hashlib
+from pathlib import Path
+from typing import Callable, Dict, Optional, Union
+
+CHUNK_SIZE = 1024 * 1024
+
+# Processed outputs kept on disk; the least recently used go first
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+
+
+def digest_of(source: Union[bytes, Path]) -> str:
+    """sha256 of raw bytes or a file, read in chunks"""
+    if not isinstance(source, Path):
+        return hashlib.sha256(source).hexdigest()
+
+    sha = hashlib.sha256()
+    with open(source, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class MediaStore:
+    """Processed uploads stored once under root/<kind>/<xx>/<sha256 of the upload>
+
+    `place` copies the cached output for an upload into a card directory,
+    running `derive` (e.g. photo compression) only for uploads it has not
+    seen. A file already holding the same content is left untouched, so
+    re-saving a card with the same photo writes nothing and git sees no
+    change.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = MAX_CACHE_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.tmp_path = self.root / 'tmp'
+
+    def path_for(self, kind: str, digest: str) -> Path:
+        return self.root / kind / digest[:2] / digest
+
+    def get(self, kind: str, digest: str) -> Optional[Path]:
+        path = self.path_for(kind, digest)
+        if not path.exists():
+            return None
+        os.utime(path)
+        return path
+
+    def put(self, kind: str, digest: str, data: bytes) -> Path:
+        path = self.path_for(kind, digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, data, self.tmp_path)
+        self.prune()
+        return path
+
+    def get_params(self, kind: str, digest: str) -> Optional[Dict]:
+        """Parameters recorded for deriving this upload (e.g. the chosen JPEG quality)"""
+        try:
+            with open(self.path_for(kind, digest).with_suffix('.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def set_params(self, kind: str, digest: str, params: Dict):
+        path = self.path_for(kind, digest).with_suffix('.json')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, json.dumps(params).encode('utf-8'), self.tmp_path)
+
+    def place(
+        self,
+        source: Union[bytes, Path],
+        dest: Path,
+        kind: str,
+        derive: Optional[Callable[[Union[bytes, Path]], bytes]] = None,
+        digest: Optional[str] = None
+    ) -> bool:
+        """Write the (derived) content of `source` to dest; False if dest already had it
+
+        `digest` saves re-hashing when the caller already has it.
+        """
+        dest = Path(dest)
+        if derive is None:
+            # Stored as uploaded: the upload is its own output, no need to cache it
+            if _same_content(dest, source):
+                return False
+            if isinstance(source, Path):
+                copy_atomic(source, dest, self.tmp_path)
+            else:
+                write_atomic(dest, source, self.tmp_path)
+            return True
+
+        digest = digest or digest_of(source)
+        output = self.get(kind, digest)
+        if output is None:
+            output = self.put(kind, digest, derive(source))
+
+        if _same_content(dest, output):
+            return False
+        copy_atomic(output, dest, self.tmp_path)
+        return True
+
+    def unchanged(self, source: Union[bytes, Path], dest: Path, kind: str) -> bool:
+        """Whether dest already holds the cached output for source (nothing to do)"""
+        output = self.get(kind, digest_of(source))
+        return output is not None and _same_content(Path(dest), output)
+
+    def prune(self):
+        """Drop the least recently used outputs beyond max_bytes"""
+        entries = []
+        for path in self.root.glob('*/*/*'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def tmp_path_for(clients_path: Path) -> Path:
+    """Where atomic writes into the clients repo stage their tmp files
+
+    Outside the clients repo, so a scoped `git add` there never picks up a
+    half-written file, but on the same filesystem so os.replace still works.
+    """
+    return Path(clients_path).parent / '.media_cache' / 'tmp'
+
+
+def _tmp_file(tmp_dir: Path, path: Path) -> Path:
+    # Unique tmp name: bulk import workers may write the same digest at once
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    return tmp_dir / f'{path.parent.name}.{path.name}.{uuid.uuid4().hex}.tmp'
+
+
+def write_atomic(path: Path, data: bytes, tmp_dir: Path):
+    tmp_path = _tmp_file(tmp_dir, path)
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def copy_atomic(source: Path, dest: Path, tmp_dir: Path):
+    tmp_path = _tmp_file(tmp_dir, dest)
+    shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, dest)
+
+
+def _same_content(path: Path, source: Union[bytes, Path]) -> bool:
+    """Whether path exists with exactly the content of source (size checked first)"""
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        return False
+    source_size = source.stat().st_size if isinstance(source, Path) else len(source)
+    return size == source_size and digest_of(path) == digest_of(source)
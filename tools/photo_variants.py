@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Maroof - Responsive Photo Variants
+Builds smaller WebP/JPEG copies of card photos and the srcset data templates use
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from media_store import tmp_path_for, write_atomic
+
+# Avatars render at ~120 CSS px; these cover 1x-3x screens
+VARIANT_WIDTHS = (160, 320, 640)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+# photo.jpg itself: longest side and JPEG quality
+PHOTO_MAX_SIZE = (800, 800)
+PHOTO_QUALITY = 85
+
+# Byte budget for photo.jpg; quality is lowered (down to the minimum) to fit it
+PHOTO_BUDGET_BYTES = 60 * 1024
+PHOTO_MIN_QUALITY = 40
+
+PHOTO_FILENAME = 'photo.jpg'
+MANIFEST_FILENAME = 'photo.srcset.json'
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Small shared process pool for encoding variants"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=min(len(VARIANT_WIDTHS), os.cpu_count() or 1))
+        return _pool
+
+
+def fit_size(size: Tuple[int, int], max_size: Tuple[int, int]) -> Tuple[int, int]:
+    """Largest size within max_size keeping the aspect ratio (never upscales)"""
+    width, height = size
+    scale = min(max_size[0] / width, max_size[1] / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _shrink(img, size: Tuple[int, int]):
+    """Resize an unloaded image, letting the decoder do most of the work
+
+    JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale (draft mode); other
+    formats are box-reduced by an integer factor before the LANCZOS pass.
+    """
+    from PIL import Image
+
+    if img.size == size:
+        return img
+    box = None
+    drafted = img.draft(None, size)
+    if drafted is not None:
+        box = drafted[1]
+    return img.resize(size, Image.Resampling.LANCZOS, box=box, reducing_gap=3.0)
+
+
+def _load_photo(source: Union[bytes, Path], max_size: Tuple[int, int]):
+    """Decoded, shrunk RGB/L image of an upload, transparency flattened onto white"""
+    from io import BytesIO
+    from PIL import Image
+
+    with Image.open(source if isinstance(source, Path) else BytesIO(source)) as img:
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        img = _shrink(img, fit_size(img.size, max_size))
+
+        if img.mode in ('RGBA', 'LA'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+        elif img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.load()
+        return img
+
+
+def encode_jpeg(img, quality: int, progressive: bool = False) -> bytes:
+    """JPEG bytes without metadata (no EXIF, ICC profile, XMP or comment)"""
+    from io import BytesIO
+
+    output = BytesIO()
+    img.save(output, format='JPEG', quality=quality, optimize=True, progressive=progressive, comment=b'')
+    return output.getvalue()
+
+
+def fit_budget(img, budget: int, max_quality: int = PHOTO_QUALITY,
+               min_quality: int = PHOTO_MIN_QUALITY) -> Tuple[bytes, Dict]:
+    """Highest JPEG quality that fits `budget` bytes, and the parameters chosen
+
+    Progressive at max_quality is tried first and kept when it fits. Only
+    when it is over budget is baseline tried, and if that is over too the
+    quality is binary-searched in whichever mode was smaller. When even
+    min_quality is over budget, min_quality is used.
+    """
+    data, progressive = encode_jpeg(img, max_quality, True), True
+    quality = max_quality
+
+    if len(data) > budget:
+        baseline = encode_jpeg(img, max_quality, False)
+        if len(baseline) < len(data):
+            data, progressive = baseline, False
+
+    if len(data) > budget:
+        best = None
+        low, high = min_quality, max_quality - 1
+        while low <= high:
+            mid = (low + high) // 2
+            candidate = encode_jpeg(img, mid, progressive)
+            if len(candidate) <= budget:
+                best = (candidate, mid)
+                low = mid + 1
+            else:
+                high = mid - 1
+        data, quality = best or (encode_jpeg(img, min_quality, progressive), min_quality)
+
+    return data, {'quality': quality, 'progressive': progressive, 'budget': budget}
+
+
+def compress_photo(source: Union[bytes, Path], max_size: Tuple[int, int] = PHOTO_MAX_SIZE,
+                   quality: int = PHOTO_QUALITY) -> bytes:
+    """Decode, shrink and re-encode an uploaded photo as JPEG at a fixed quality
+
+    A 12 MP phone photo is never held in memory at full size, and
+    transparency is flattened onto white after shrinking.
+    """
+    return encode_jpeg(_load_photo(source, max_size), quality)
+
+
+def compress_photo_to_budget(source: Union[bytes, Path], budget: int = PHOTO_BUDGET_BYTES,
+                             params: Optional[Dict] = None,
+                             max_size: Tuple[int, int] = PHOTO_MAX_SIZE) -> Tuple[bytes, Dict]:
+    """compress_photo within a byte budget; returns the JPEG and its parameters
+
+    `params` from an earlier search of the same source (and budget) skip
+    the search and encode once.
+    """
+    img = _load_photo(source, max_size)
+    if params and params.get('budget') == budget:
+        return encode_jpeg(img, params['quality'], params['progressive']), params
+    return fit_budget(img, budget)
+
+
+def _encode_variant(photo_path: str, width: int) -> Dict:
+    """Write the WebP and JPEG copies of one width (runs in a worker process)"""
+    from PIL import Image
+
+    photo_path = Path(photo_path)
+    with Image.open(photo_path) as img:
+        height = round(img.height * width / img.width)
+        if width < img.width:
+            img = _shrink(img, (width, height))
+        img = img.convert('RGB')
+
+        stem = f"{photo_path.stem}-{width}"
+        img.save(photo_path.with_name(f"{stem}.webp"), format='WEBP', quality=WEBP_QUALITY, method=4)
+        img.save(photo_path.with_name(f"{stem}.jpg"), format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+
+    return {'width': width, 'height': height, 'webp': f"{stem}.webp", 'jpeg': f"{stem}.jpg"}
+
+
+def variant_widths(source_width: int) -> List[int]:
+    """Target widths smaller than the source (or just the source width)"""
+    widths = [w for w in VARIANT_WIDTHS if w < source_width]
+    return widths or [source_width]
+
+
+def read_manifest(client_dir: Path) -> Optional[Dict]:
+    try:
+        with open(Path(client_dir) / MANIFEST_FILENAME, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def remove_variants(client_dir: Path):
+    """Delete variants and manifest (photo removed or replaced)"""
+    client_dir = Path(client_dir)
+    manifest = read_manifest(client_dir)
+    if manifest:
+        for variant in manifest.get('variants', []):
+            for key in ('webp', 'jpeg'):
+                (client_dir / variant[key]).unlink(missing_ok=True)
+    (client_dir / MANIFEST_FILENAME).unlink(missing_ok=True)
+
+
+def build_variants(client_dir: Path, pool: Optional[Executor] = None, force: bool = False) -> Optional[Dict]:
+    """Encode all widths of photo.jpg, one pool task per width, and write the manifest
+
+    Skips work when the manifest already matches the current photo.
+    Returns the manifest, or None when the card has no photo.
+    """
+    from PIL import Image
+
+    client_dir = Path(client_dir)
+    photo_path = client_dir / PHOTO_FILENAME
+    try:
+        photo_bytes = photo_path.read_bytes()
+    except FileNotFoundError:
+        remove_variants(client_dir)
+        return None
+
+    digest = hashlib.sha256(photo_bytes).hexdigest()
+    manifest = read_manifest(client_dir)
+    if not force and manifest and manifest.get('source') == digest:
+        return manifest
+
+    remove_variants(client_dir)
+    with Image.open(photo_path) as img:
+        source_width = img.width
+
+    widths = variant_widths(source_width)
+    if pool is None:
+        variants = [_encode_variant(str(photo_path), w) for w in widths]
+    else:
+        futures = [pool.submit(_encode_variant, str(photo_path), w) for w in widths]
+        variants = [f.result() for f in futures]
+
+    variants.sort(key=lambda v: v['width'])
+    manifest = {
+        'source': digest,
+        'variants': variants,
+        'srcset': ', '.join(f"./{v['jpeg']} {v['width']}w" for v in variants),
+        'srcset_webp': ', '.join(f"./{v['webp']} {v['width']}w" for v in variants)
+    }
+    write_atomic(client_dir / MANIFEST_FILENAME, json.dumps(manifest, indent=2).encode('utf-8'),
+                 tmp_path_for(client_dir.parent))
+    return manifest
+
+
+def srcset_fields(manifest: Optional[Dict]) -> Dict[str, str]:
+    """Card data fields the template engine turns into <picture>/srcset"""
+    if not manifest:
+        return {'PHOTO_SRCSET': '', 'PHOTO_SRCSET_WEBP': ''}
+    return {'PHOTO_SRCSET': manifest['srcset'], 'PHOTO_SRCSET_WEBP': manifest['srcset_webp']}
+
+
+if __name__ == "__main__":
+    from create_card import CardGenerator
+
+    parser = argparse.ArgumentParser(description="Build responsive photo variants for existing cards")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: all cores)")
+    parser.add_argument('--force', action='store_true', help="Rebuild variants even if the photo is unchanged")
+    args = parser.parse_args()
+
+    generator = CardGenerator()
+    usernames = [c['username'] for c in generator.list_cards()]
+    with_photo = [u for u in usernames if (generator.clients_path / u / PHOTO_FILENAME).exists()]
+
+    built = 0
+    with ProcessPoolExecutor(max_workers=args.workers or os.cpu_count() or 1) as pool:
+        futures = {pool.submit(build_variants, generator.clients_path / u, None, args.force): u for u in with_photo}
+        for done, future in enumerate(as_completed(futures), 1):
+            username = futures[future]
+            try:
+                if generator.apply_photo_variants(username, future.result()):
+                    built += 1
+            except Exception as e:
+                print(f"\n⚠️ {username}: {e}")
+            print(f"\r🖼️ {done}/{len(with_photo)} cards", end='', flush=True)
+    print()
+    print(f"✅ Updated srcset for {built} cards")
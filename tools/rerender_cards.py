@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Maroof - Bulk Card Re-render
+Regenerates index.html for existing cards after a template change
+"""
+
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from create_card import CardGenerator, CardRenderer
+from build_manifest import build_card, get_manifest
+
+# Per-process renderer, created once by the pool initializer
+_worker_renderer = None
+
+
+def _init_worker(repo_path: str):
+    global _worker_renderer
+    _worker_renderer = CardRenderer(repo_path)
+
+
+def _rerender_one(username: str) -> bool:
+    return _worker_renderer.rerender_card(username)
+
+
+def _build_one(username: str, entry: Optional[Dict], force: bool) -> Optional[Dict]:
+    return build_card(_worker_renderer, username, entry, force)
+
+
+def select_cards(generator: CardGenerator, template: str = None, status: str = None) -> List[str]:
+    """Usernames of cards matching the template/status filters"""
+    cards = generator.list_cards(status_filter=status)
+    if template:
+        cards = [c for c in cards if c.get('template') == template]
+    return [c['username'] for c in cards]
+
+
+def rerender_cards(
+    generator: CardGenerator,
+    template: str = None,
+    status: str = None,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[int, int, float], None]] = None,
+    incremental: bool = False,
+    force: bool = False
+) -> Dict:
+    """Re-render matching cards across a process pool
+
+    In incremental mode every output (index.html, contact.vcf, .pkpass) is
+    checked against the build manifest and only stale ones are rebuilt.
+    """
+    usernames = select_cards(generator, template, status)
+    total = len(usernames)
+    workers = workers or os.cpu_count() or 1
+    manifest = get_manifest(generator) if incremental else None
+
+    rendered = []
+    skipped = 0
+    failed = []
+    start = time.time()
+
+    if total:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, total),
+            # Spawned, not forked: the web app starts this from a threaded process
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(str(generator.repo_path),)
+        ) as pool:
+            if manifest is not None:
+                futures = {pool.submit(_build_one, u, manifest.get(u), force): u for u in usernames}
+            else:
+                futures = {pool.submit(_rerender_one, u): u for u in usernames}
+
+            for done, future in enumerate(as_completed(futures), 1):
+                username = futures[future]
+                try:
+                    result = future.result()
+                    if not result:
+                        failed.append(username)
+                    elif manifest is None:
+                        rendered.append(username)
+                    else:
+                        manifest.record(username, result)
+                        if result['built']:
+                            rendered.append(username)
+                        else:
+                            skipped += 1
+                except Exception as e:
+                    print(f"⚠️ Re-render failed for {username}: {e}")
+                    failed.append(username)
+
+                if progress:
+                    progress(done, total, time.time() - start)
+
+    if manifest is not None:
+        if not template and not status:
+            manifest.prune(usernames)
+        manifest.save()
+
+    elapsed = time.time() - start
+    return {
+        'total': total,
+        'rendered': len(rendered),
+        'rendered_usernames': sorted(rendered),
+        'skipped': skipped,
+        'failed': failed,
+        'elapsed': round(elapsed, 3),
+        'cards_per_second': round(total / elapsed, 1) if elapsed > 0 else 0.0
+    }
+
+
+def print_progress(done: int, total: int, elapsed: float):
+    rate = done / elapsed if elapsed > 0 else 0.0
+    print(f"\r🔄 {done}/{total} cards ({rate:.1f} cards/s)", end='', flush=True)
+    if done == total:
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-render index.html for existing cards")
+    parser.add_argument('--template', help="Only cards using this template")
+    parser.add_argument('--status', choices=['pending', 'printed', 'modified'], help="Only cards with this status")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: all cores)")
+    parser.add_argument('--incremental', action='store_true', help="Only rebuild outputs whose inputs changed")
+    parser.add_argument('--force', action='store_true', help="With --incremental, rebuild everything and refresh the manifest")
+    args = parser.parse_args()
+
+    result = rerender_cards(
+        CardGenerator(),
+        template=args.template,
+        status=args.status,
+        workers=args.workers,
+        progress=print_progress,
+        incremental=args.incremental or args.force,
+        force=args.force
+    )
+
+    print(f"✅ Re-rendered {result['rendered']}/{result['total']} cards "
+          f"in {result['elapsed']:.1f}s ({result['cards_per_second']} cards/s)")
+    if result['skipped']:
+        print(f"⏭️ Skipped {result['skipped']} unchanged cards")
+    if result['failed']:
+        print(f"⚠️ Failed: {', '.join(result['failed'])}")
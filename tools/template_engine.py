@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Maroof - Card Template Engine
+Compiles card templates once into segments and renders them in one pass
+"""
+
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Same tag syntax the cards have always used: {{KEY}}, {{#if KEY}}, {{#if !KEY}}, {{/if}}
+TAG_PATTERN = re.compile(r'\{\{([^}]+)\}\}')
+IF_PATTERN = re.compile(r'#if (!?)(\w+)$')
+
+# <img src="{{KEY}}" ...> is compiled as a responsive image (see _render_picture)
+TOKEN_PATTERN = re.compile(r'<img\s+src="\{\{(\w+)\}\}"([^>]*?)\s*/?>|\{\{([^}]+)\}\}')
+
+# Layout hint for srcset when the data has no KEY_SIZES (card avatars are ~120 CSS px)
+DEFAULT_IMAGE_SIZES = '160px'
+
+# Segment kinds
+LITERAL = 0
+VARIABLE = 1
+CONDITIONAL = 2
+PICTURE = 3
+
+Segment = Tuple
+
+
+class CompiledTemplate:
+    """Card template parsed into a tree of literal, variable and conditional segments"""
+
+    __slots__ = ('segments', 'keys')
+
+    def __init__(self, segments: List[Segment], keys: frozenset):
+        self.segments = segments
+        self.keys = keys
+
+    def render(self, data: Dict) -> str:
+        """Render template with card data in a single pass"""
+        out = []
+        _render_segments(self.segments, data, out)
+        return ''.join(out)
+
+
+_MISSING = object()
+
+
+def _value(data: Dict, key: str) -> str:
+    value = data.get(key)
+    if not value:
+        return ''
+    value = str(value)
+    # Values never inject tags of their own
+    if '{{' in value:
+        value = TAG_PATTERN.sub('', value)
+    return value
+
+
+def _render_picture(key: str, attributes: List[Segment], data: Dict, out: List[str]):
+    """Plain <img>, or <picture> with WebP/JPEG srcset when KEY_SRCSET is in the data"""
+    src = _value(data, key)
+    attrs: List[str] = []
+    _render_segments(attributes, data, attrs)
+    attrs = ''.join(attrs)
+
+    srcset = _value(data, f'{key}_SRCSET')
+    if not srcset:
+        out.append(f'<img src="{src}"{attrs}>')
+        return
+
+    sizes = _value(data, f'{key}_SIZES') or DEFAULT_IMAGE_SIZES
+    out.append('<picture style="display:contents">')
+    webp = _value(data, f'{key}_SRCSET_WEBP')
+    if webp:
+        out.append(f'<source type="image/webp" srcset="{webp}" sizes="{sizes}">')
+    out.append(f'<img src="{src}" srcset="{srcset}" sizes="{sizes}"{attrs}></picture>')
+
+
+def _render_segments(segments: List[Segment], data: Dict, out: List[str]):
+    for segment in segments:
+        kind = segment[0]
+        if kind == LITERAL:
+            out.append(segment[1])
+        elif kind == VARIABLE:
+            value = _value(data, segment[1])
+            if value:
+                out.append(value)
+        elif kind == PICTURE:
+            _render_picture(segment[1], segment[2], data, out)
+        else:
+            _, key, negate, children = segment
+            value = data.get(key, _MISSING)
+            # Unknown keys keep their block, like the old cleanup pass did
+            if value is _MISSING or bool(value) != negate:
+                _render_segments(children, data, out)
+
+
+def compile_template(html: str) -> CompiledTemplate:
+    """Parse template text into a segment tree
+
+    Blocks nest: {{/if}} closes the innermost open {{#if}}. The old regex
+    renderer closed at the next {{/if}} instead, which left a stray or missing
+    </div> around the nested blocks in classic, friendly, modern and
+    professional (see tests/test_template_parity.py).
+    """
+    root: List[Segment] = []
+    stack: List[Tuple[str, bool, List[Segment], List[Segment]]] = []
+    current = root
+    keys = set()
+    position = 0
+
+    for match in TOKEN_PATTERN.finditer(html):
+        if match.start() > position:
+            current.append((LITERAL, html[position:match.start()]))
+        position = match.end()
+
+        if match.group(1):
+            attributes = compile_template(match.group(2))
+            keys.add(match.group(1))
+            keys.update(attributes.keys)
+            current.append((PICTURE, match.group(1), attributes.segments))
+            continue
+
+        tag = match.group(3)
+        if_match = IF_PATTERN.match(tag)
+
+        if if_match:
+            key = if_match.group(2)
+            keys.add(key)
+            children: List[Segment] = []
+            stack.append((key, if_match.group(1) == '!', children, current))
+            current = children
+        elif tag == '/if':
+            # Stray closing tags are dropped
+            if stack:
+                key, negate, children, parent = stack.pop()
+                parent.append((CONDITIONAL, key, negate, children))
+                current = parent
+        elif tag.startswith('#') or tag.startswith('/') or tag == 'else':
+            # Unsupported block tags are stripped
+            continue
+        else:
+            keys.add(tag)
+            current.append((VARIABLE, tag))
+
+    if position < len(html):
+        current.append((LITERAL, html[position:]))
+
+    # Unclosed blocks keep their content
+    while stack:
+        _, _, children, parent = stack.pop()
+        parent.extend(children)
+
+    return CompiledTemplate(_merge_literals(root), frozenset(keys))
+
+
+def _merge_literals(segments: List[Segment]) -> List[Segment]:
+    """Join adjacent literals left behind by stripped tags"""
+    merged: List[Segment] = []
+    for segment in segments:
+        if segment[0] == CONDITIONAL:
+            segment = (CONDITIONAL, segment[1], segment[2], _merge_literals(segment[3]))
+        elif segment[0] == LITERAL and merged and merged[-1][0] == LITERAL:
+            merged[-1] = (LITERAL, merged[-1][1] + segment[1])
+            continue
+        merged.append(segment)
+    return merged
+
+
+@lru_cache(maxsize=32)
+def compile_cached(html: str) -> CompiledTemplate:
+    """Compile template text, reusing earlier results for identical text"""
+    return compile_template(html)
+
+
+class TemplateRegistry:
+    """Process-wide cache of card templates keyed by path and mtime"""
+
+    def __init__(self, templates_dir: Path):
+        self.templates_dir = Path(templates_dir)
+        self._entries: Dict[Path, Tuple[int, int, str, CompiledTemplate]] = {}
+        self._names: List[str] = []
+        self._dir_mtime = None
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[Tuple[str, CompiledTemplate]]:
+        """Return (text, compiled) for a template, rereading only if it changed"""
+        path = self.templates_dir / f"{name}.html"
+        try:
+            stat = path.stat()
+        except OSError:
+            with self._lock:
+                self._entries.pop(path, None)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                return entry[2], entry[3]
+
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        compiled = compile_cached(text)
+
+        with self._lock:
+            self._entries[path] = (stat.st_mtime_ns, stat.st_size, text, compiled)
+        return text, compiled
+
+    def names(self) -> List[str]:
+        """Template names, rescanning the directory only when it changed"""
+        try:
+            dir_mtime = self.templates_dir.stat().st_mtime_ns
+        except OSError:
+            return []
+
+        with self._lock:
+            if dir_mtime != self._dir_mtime:
+                self._names = sorted(f.stem for f in self.templates_dir.glob("*.html"))
+                self._dir_mtime = dir_mtime
+            return list(self._names)
+
+
+_registries: Dict[Path, TemplateRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(templates_dir: Path) -> TemplateRegistry:
+    """Shared registry for a templates directory"""
+    key = Path(templates_dir).resolve()
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = TemplateRegistry(key)
+        return _registries[key]
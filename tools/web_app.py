@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Request, Response, request, jsonify, render_template
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
 import sys
 import json
+import uuid
+import queue
+import hashlib
+import tempfile
 import subprocess
 import threading
 from pathlib import Path
@@ -12,23 +17,115 @@ current_dir = Path(__file__).resolve().parent
 sys.path.append(str(current_dir))
 
 from create_card import CardGenerator
+from card_index import SORT_KEYS
 from nfc_writer import NFCWriter
+from rerender_cards import rerender_cards
+from event_bus import format_sse
+from photo_variants import get_pool
+from job_queue import JobQueue
 
 # Ngrok public URL (set when tunnel starts)
 NGROK_PUBLIC_URL = None
 
+# Per-file limits for multipart uploads, enforced while the file streams in
+MAX_PHOTO_BYTES = 5 * 1024 * 1024
+MAX_CV_BYTES = 5 * 1024 * 1024
+
+class UploadFile:
+    """Temp file for one uploaded part that refuses to grow past its limit"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.size = 0
+        self.file = tempfile.NamedTemporaryFile(prefix='maroof-upload-')
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.limit:
+            self.file.close()
+            raise RequestEntityTooLarge(f'File exceeds {self.limit // (1024 * 1024)}MB limit')
+        return self.file.write(chunk)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+class UploadRequest(Request):
+    """Streams multipart file parts to disk in chunks instead of memory"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        limit = MAX_PHOTO_BYTES if (content_type or '').startswith('image/') else MAX_CV_BYTES
+        return UploadFile(limit)
+
 app = Flask(__name__, template_folder='../templates/pages', static_folder='../static')
+app.request_class = UploadRequest
 app.config['JSON_AS_ASCII'] = False
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
 
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,If-None-Match')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    response.headers.add('Access-Control-Expose-Headers', 'ETag')
     return response
 
 generator = CardGenerator()
+generator.media_pool = get_pool()
+# Photos and .pkpass are built off the request thread; cards show as processing meanwhile
+generator.media_jobs = JobQueue(workers=2)
+
+# Changes on every restart so a reset version counter never yields a false 304
+BOOT_ID = uuid.uuid4().hex[:8]
+# Event ids carry it too, so a client reconnecting after a restart gets a resync
+generator.events.run_id = BOOT_ID
+
+def collection_etag(name):
+    """Validator for a response derived from the card collection and query string"""
+    query = hashlib.md5(request.query_string).hexdigest()[:8]
+    return f'{name}-{BOOT_ID}-{generator.cards_version()}-{query}'
+
+def not_modified(etag):
+    """304 response if the client already holds this version, else None"""
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return None
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# Accepted type (mimetype prefix) and error for each upload field
+UPLOAD_TYPES = {
+    'photo': ('image/', 'Photo must be an image'),
+    'cv': ('application/pdf', 'CV must be a PDF file')
+}
+
+def card_payload():
+    """Card fields from a JSON body (photo/cv as data URLs) or a multipart form
+    (photo/cv as uploaded files, passed on as temp file paths)
+
+    Raises BadRequest for a photo that is not an image or a CV that is not a PDF.
+    """
+    if request.mimetype == 'multipart/form-data':
+        data = request.form.to_dict()
+        for field, (mimetype, error) in UPLOAD_TYPES.items():
+            upload = request.files.get(field)
+            if upload and upload.filename:
+                if not upload.mimetype.startswith(mimetype):
+                    raise BadRequest(error)
+                data[field] = Path(upload.stream.name)
+        return data
+
+    data = request.get_json() or {}
+    for field, (mimetype, error) in UPLOAD_TYPES.items():
+        value = data.get(field)
+        if value and not (isinstance(value, str) and value.startswith(f'data:{mimetype}')):
+            raise BadRequest(error)
+    return data
 
 @app.route('/')
 def index():
@@ -61,7 +158,7 @@ def get_templates():
 @app.route('/api/create', methods=['POST'])
 def create_card():
     try:
-        data = request.get_json() or {}
+        data = card_payload()
         name = (data.get('name') or '').strip()
         if not name:
             return jsonify({'success': False, 'error': 'Name is required'}), 400
@@ -89,21 +186,26 @@ def create_card():
             source='admin'
         )
         
-        generator.git_push_background(f"Add card: {name}")
+        generator.git_push_background(f"Add card: {name}", [result['username']])
         
         return jsonify({
             'success': True,
             'url': result['url'],
             'username': result['username'],
-            'template': result['template']
+            'template': result['template'],
+            'job': result['job']
         }), 201
+    except RequestEntityTooLarge as e:
+        return jsonify({'success': False, 'error': e.description}), 413
+    except BadRequest as e:
+        return jsonify({'success': False, 'error': e.description}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': f'Error: {str(e)}'}), 500
 
 @app.route('/api/register', methods=['POST'])
 def register_card():
     try:
-        data = request.get_json() or {}
+        data = card_payload()
         name = (data.get('name') or '').strip()
         if not name:
             return jsonify({'success': False, 'error': 'Name is required'}), 400
@@ -131,27 +233,145 @@ def register_card():
             source='client'
         )
         
-        generator.git_push_background(f"Client registration: {name}")
+        generator.git_push_background(f"Client registration: {name}", [result['username']])
         
         return jsonify({
             'success': True,
             'message': 'Registration successful',
-            'username': result['username']
+            'username': result['username'],
+            'job': result['job']
         }), 201
+    except RequestEntityTooLarge as e:
+        return jsonify({'success': False, 'error': e.description}), 413
+    except BadRequest as e:
+        return jsonify({'success': False, 'error': e.description}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': f'Error: {str(e)}'}), 500
 
 @app.route('/api/cards', methods=['GET'])
 def list_cards():
     try:
-        cards = generator.list_cards()
-        stats = {
-            'pending': len([c for c in cards if c.get('status') == 'pending']),
-            'printed': len([c for c in cards if c.get('status') == 'printed']),
-            'modified': len([c for c in cards if c.get('status') == 'modified']),
-            'total': len(cards)
-        }
-        return jsonify({'success': True, 'cards': cards, 'stats': stats})
+        etag = collection_etag('cards')
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        args = request.args
+        page = max(args.get('page', 1, type=int), 1)
+        limit = args.get('limit', type=int)
+        if limit is not None:
+            limit = min(max(limit, 1), 200)
+
+        sort = args.get('sort', 'created_at')
+        order = args.get('order', 'desc')
+        if sort not in SORT_KEYS or order not in ('asc', 'desc'):
+            return jsonify({'success': False, 'error': 'Invalid sort'}), 400
+
+        cards, total = generator.query_cards(
+            status=args.get('status') or None,
+            source=args.get('source') or None,
+            template=args.get('template') or None,
+            created_from=args.get('from') or None,
+            created_to=args.get('to') or None,
+            search=(args.get('q') or '').strip() or None,
+            sort=sort,
+            descending=(order == 'desc'),
+            offset=(page - 1) * limit if limit else 0,
+            limit=limit
+        )
+        stats = generator.card_stats()
+        return with_etag(jsonify({
+            'success': True,
+            'cards': cards,
+            'stats': stats,
+            'total': total,
+            'page': page if limit else 1,
+            'pages': max((total + limit - 1) // limit, 1) if limit else 1,
+            'limit': limit
+        }), etag)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/events')
+def card_events():
+    """Server-sent stream of card and git-sync events"""
+    last_event_id = request.headers.get('Last-Event-ID')
+    subscriber = generator.events.subscribe(last_event_id)
+
+    def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event_id, event, data = subscriber.get(timeout=15)
+                except queue.Empty:
+                    # Keepalive also detects closed connections
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_sse(generator.events.event_id(event_id), event, data)
+        finally:
+            generator.events.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/stats', methods=['GET'])
+def card_stats():
+    try:
+        etag = collection_etag('stats')
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        return with_etag(jsonify({'success': True, 'stats': generator.card_stats()}), etag)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/git/status', methods=['GET'])
+def git_status():
+    return jsonify({'success': True, **generator.git_sync_status()})
+
+@app.route('/api/git/unpublished', methods=['GET'])
+def git_unpublished():
+    try:
+        return jsonify({'success': True, **generator.unpublished_cards()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/git/maintenance', methods=['GET'])
+def git_maintenance_report():
+    maintenance = generator.git_sync.maintenance
+    return jsonify({
+        'success': True,
+        'running': generator.git_sync_status()['maintenance_running'],
+        'due': maintenance.due(),
+        'report': maintenance.last_report
+    })
+
+@app.route('/api/git/maintenance', methods=['POST'])
+def git_maintenance_run():
+    data = request.get_json(silent=True) or {}
+    generator.git_sync.request_maintenance(full=bool(data.get('full')))
+    return jsonify({'success': True, 'message': 'Maintenance queued'}), 202
+
+@app.route('/api/git/retry', methods=['POST'])
+def git_retry():
+    generator.git_sync.retry_now()
+    return jsonify({'success': True, **generator.git_sync_status()})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = generator.media_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/api/admin/reindex', methods=['POST'])
+def reindex_cards():
+    try:
+        count = generator.rebuild_card_index()
+        return jsonify({'success': True, 'count': count, 'stats': generator.card_stats()})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -168,7 +388,7 @@ def get_card(username):
 @app.route('/api/cards/<username>', methods=['PUT'])
 def update_card(username):
     try:
-        data = request.get_json() or {}
+        data = card_payload()
         
         result = generator.update_card(
             username=username,
@@ -193,9 +413,13 @@ def update_card(username):
             cv=data.get('cv')
         )
         
-        generator.git_push_background(f"Update card: {username}")
+        generator.git_push_background(f"Update card: {username}", [username])
         
         return jsonify({'success': True, 'result': result})
+    except RequestEntityTooLarge as e:
+        return jsonify({'success': False, 'error': e.description}), 413
+    except BadRequest as e:
+        return jsonify({'success': False, 'error': e.description}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -203,19 +427,70 @@ def update_card(username):
 def delete_card(username):
     try:
         if generator.delete_card(username):
-            generator.git_push_background(f"Delete card: {username}")
+            generator.git_push_background(f"Delete card: {username}", [username])
             return jsonify({'success': True})
         return jsonify({'success': False, 'error': 'Card not found'}), 404
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Bulk re-render progress (one job at a time)
+rerender_state = {'running': False, 'done': 0, 'total': 0, 'cards_per_second': 0.0, 'result': None}
+# Guards every read and write of rerender_state (request threads and the re-render thread)
+rerender_lock = threading.Lock()
+
+@app.route('/api/admin/rerender', methods=['POST'])
+def start_rerender():
+    data = request.get_json(silent=True) or {}
+    template = data.get('template') or None
+    status = data.get('status') or None
+    incremental = bool(data.get('incremental'))
+
+    with rerender_lock:
+        if rerender_state['running']:
+            return jsonify({'success': False, 'error': 'Re-render already running'}), 409
+        rerender_state.update({'running': True, 'done': 0, 'total': 0, 'cards_per_second': 0.0, 'result': None})
+
+    def progress(done, total, elapsed):
+        with rerender_lock:
+            rerender_state.update({
+                'done': done,
+                'total': total,
+                'cards_per_second': round(done / elapsed, 1) if elapsed > 0 else 0.0
+            })
+
+    def run():
+        result, usernames = None, []
+        try:
+            result = rerender_cards(generator, template=template, status=status, progress=progress, incremental=incremental)
+            usernames = result.pop('rendered_usernames')
+        except Exception as e:
+            result = {'error': str(e)}
+        finally:
+            with rerender_lock:
+                rerender_state.update({'running': False, 'result': result})
+        if usernames:
+            generator.git_push_background(f"Re-render {len(usernames)} cards", usernames)
+
+    threading.Thread(target=run, daemon=True).start()
+    return jsonify({'success': True, 'message': 'Re-render started'}), 202
+
+@app.route('/api/admin/rerender', methods=['GET'])
+def rerender_status():
+    with rerender_lock:
+        state = dict(rerender_state)
+    return jsonify({'success': True, **state})
+
 @app.route('/api/nfc/test', methods=['GET'])
 def nfc_test():
     try:
         writer = NFCWriter()
         if writer.ensure_connected():
             writer.close()
-            return jsonify({'success': True, 'message': 'NFC reader connected'})
+            # Reader state is not versioned, so validate on the body hash
+            response = jsonify({'success': True, 'message': 'NFC reader connected'})
+            response.add_etag()
+            response.headers['Cache-Control'] = 'no-cache'
+            return response.make_conditional(request)
         return jsonify({'success': False, 'message': 'Failed to connect'}), 503
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
@@ -236,7 +511,7 @@ def nfc_write():
         
         if ok and username:
             generator.mark_as_printed(username)
-            generator.git_push_background(f"Print card: {username}")
+            generator.git_push_background(f"Print card: {username}", [username])
         
         return jsonify({'success': ok, 'message': msg})
     except Exception as e:
@@ -258,8 +533,13 @@ def nfc_read():
 @app.route('/api/pending-count', methods=['GET'])
 def get_pending_count_api():
     try:
-        count = len(generator.list_cards(status_filter='pending'))
-        return jsonify({'count': count})
+        etag = collection_etag('pending')
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        count = generator.card_stats()['pending']
+        return with_etag(jsonify({'count': count}), etag)
     except:
         return jsonify({'count': 0})
 
@@ -663,7 +943,7 @@ def webhook_register():
         )
         
         # Git push
-        generator.git_push_background(f"Webhook registration: {data.get('name')}")
+        generator.git_push_background(f"Webhook registration: {data.get('name')}", [result['username']])
         
         return jsonify({
             'success': True,
@@ -783,6 +1063,19 @@ if __name__ == '__main__':
 
     print("="*60)
 
+    # Load the card index once so dashboard polls never scan clients/
+    print(f"🗂️ Indexed {len(generator.list_cards())} cards")
+
+    # Publish anything left unpushed by the previous run
+    replayed = generator.git_sync.start()
+    if replayed:
+        print(f"📤 Replaying {replayed} unpublished changes")
+
+    # Finish photo/.pkpass work interrupted by the previous run
+    resumed = generator.resume_media_jobs()
+    if resumed:
+        print(f"🖼️ Resuming media for {resumed} cards")
+
     # Start ngrok tunnel for external access
     ngrok_url = start_ngrok(7070)
     if ngrok_url: